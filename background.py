@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+
+
+class LatestOnlyWorker:
+    # Background thread that only ever runs the most recent request. A request
+    # submitted while another is waiting replaces it, and results of requests
+    # superseded while running are dropped. Callbacks run on the Tk thread,
+    # delivered by polling a queue with root.after.
+    def __init__(self, root, min_interval=1 / 30, poll_ms=15):
+        self.root = root
+        self.min_interval = min_interval
+        self.poll_ms = poll_ms
+        self._cond = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self._results = queue.Queue()
+        self._last_start = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, callback, *args):
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, fn, args, callback)
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._generation += 1
+            self._pending = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                # Throttle to min_interval; newer requests arriving meanwhile win
+                delay = self._last_start + self.min_interval - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                generation, fn, args, callback = self._pending
+                self._pending = None
+
+            self._last_start = time.monotonic()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                print(f"Background task failed: {e}")
+                continue
+            if generation == self._generation:
+                self._results.put((generation, callback, result))
+
+    def _poll(self):
+        try:
+            while True:
+                generation, callback, result = self._results.get_nowait()
+                if generation == self._generation:
+                    callback(result)
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    # Handle passed to a TaskRunner job: report progress and stop early when
+    # the user cancels. progress() doubles as the cancellation checkpoint.
+    def __init__(self, runner):
+        self._runner = runner
+        self.cancelled = threading.Event()
+
+    def progress(self, fraction, message=None):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+        self._runner._results.put((self, 'progress', (fraction, message)))
+
+
+class TaskRunner:
+    # Runs one long job at a time on a worker thread so the Tk mainloop stays
+    # responsive. Callbacks (progress, done, error) run on the Tk thread.
+    def __init__(self, root, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.task = None
+        self._results = queue.Queue()
+        self._callbacks = {}
+        self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def busy(self):
+        return self.task is not None
+
+    def start(self, fn, args=(), on_done=None, on_progress=None, on_error=None):
+        # fn(task, *args) runs on the worker thread
+        if self.task is not None:
+            raise RuntimeError("A task is already running.")
+        task = Task(self)
+        self.task = task
+        self._callbacks[task] = (on_done, on_progress, on_error)
+        threading.Thread(target=self._run, args=(task, fn, args), daemon=True).start()
+        return task
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancelled.set()
+
+    def _run(self, task, fn, args):
+        try:
+            result = fn(task, *args)
+        except TaskCancelled:
+            self._results.put((task, 'cancelled', None))
+        except Exception as e:
+            self._results.put((task, 'error', e))
+        else:
+            if task.cancelled.is_set():
+                self._results.put((task, 'cancelled', None))
+            else:
+                self._results.put((task, 'done', result))
+
+    def _poll(self):
+        try:
+            while True:
+                task, kind, value = self._results.get_nowait()
+                on_done, on_progress, on_error = self._callbacks.get(task, (None, None, None))
+                if kind == 'progress':
+                    if on_progress is not None and not task.cancelled.is_set():
+                        on_progress(*value)
+                    continue
+
+                self._callbacks.pop(task, None)
+                if self.task is task:
+                    self.task = None
+                if kind == 'done' and on_done is not None:
+                    on_done(value)
+                elif kind == 'error' and on_error is not None:
+                    on_error(value)
+                elif kind == 'cancelled' and on_error is not None:
+                    on_error(TaskCancelled())
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,158 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sidecar import load_numeric_columns, read_column_names
+from psd_engine import welch_channels
+from psd_cache import PSDCache, cache_key
+from fingerprint import fingerprint
+from psd_export import write_psd
+
+# Headless PSDs for a whole test campaign: every CSV is loaded, scaled by the
+# sensor sensitivity, run through Welch and written out as a PSD table (CSV,
+# NPZ, Parquet or HDF5, see psd_export) and a plot, one file per worker process.
+#
+#   python batch_psd.py data/campaign --fs 2000 --nperseg 4096 -o psd_out
+
+
+def expand_inputs(patterns):
+    # Directories contribute their *.csv files; anything else is a glob
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(glob.glob(os.path.join(pattern, '*.csv')))
+        else:
+            paths.extend(glob.glob(pattern))
+    return sorted(set(paths))
+
+
+def compute_psd(file_path, columns=None, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None,
+                sensitivity=1.0, dtype=np.float64, cache=None):
+    # Returns (column names, f, Pxx) with Pxx of shape (channels, freqs) in
+    # units of (signal / sensitivity)**2 / Hz. columns defaults to every column
+    # after the first (time). The recording is only loaded on a cache miss.
+    names = read_column_names(file_path)
+    columns = list(columns) if columns is not None else list(range(1, len(names)))
+
+    key = None
+    if cache is not None:
+        source = (fingerprint(file_path), np.dtype(dtype).str)
+        key = cache_key(source, columns=tuple(columns), welch=(fs, window, nperseg, noverlap, nfft), ranges=None)
+        cached = cache.get(key)
+        if cached is not None:
+            return [names[c] for c in columns], cached['f'], cached['Pxx'] * (1.0 / sensitivity ** 2)
+
+    _, values = load_numeric_columns(file_path, dtype=dtype)
+    f, Pxx = welch_channels(values[columns], fs=fs, window=window, nperseg=nperseg, noverlap=noverlap, nfft=nfft,
+                            axis=-1, dtype=dtype)
+    if key is not None:
+        cache.put(key, f=f, Pxx=Pxx)
+    # Sensitivity is applied to the spectrum, never to the signal
+    return [names[c] for c in columns], f, Pxx * (1.0 / sensitivity ** 2)
+
+
+def write_psd_table(path, f, Pxx, names, metadata=None):
+    # The format follows the extension of path
+    return write_psd(path, f, Pxx, names=names, metadata=metadata)
+
+
+def write_psd_plot(path, f, Pxx, names, title, dpi=100):
+    # Figure + Agg canvas directly, so worker processes never touch a GUI backend
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(8, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for name, P in zip(names, Pxx):
+        ax.semilogy(f, P, label=str(name))
+    ax.set_xlabel('Frequency (Hz)')
+    ax.set_ylabel('PSD (g²/Hz)')
+    ax.set_title(title)
+    ax.legend()
+    ax.grid(True, which='both', alpha=0.3)
+    fig.savefig(path, dpi=dpi)
+
+
+def process_file(file_path, out_dir=None, plot=True, use_cache=True, table_format='csv', **params):
+    # Runs in a worker process; returns a summary dict instead of raising
+    start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    out_dir = out_dir or os.path.dirname(os.path.abspath(file_path))
+    result = {'file': file_path, 'bytes': os.path.getsize(file_path), 'error': None}
+    try:
+        names, f, Pxx = compute_psd(file_path, cache=PSDCache() if use_cache else None, **params)
+        metadata = {k: params.get(k) for k in ('fs', 'nperseg', 'noverlap', 'nfft', 'window', 'sensitivity')}
+        metadata.update(source=os.path.abspath(file_path), range=None, units='(signal / sensitivity)^2 / Hz')
+        write_psd_table(os.path.join(out_dir, f'{stem}_psd.{table_format}'), f, Pxx, names, metadata)
+        if plot:
+            write_psd_plot(os.path.join(out_dir, stem + '_psd.png'), f, Pxx, names, f'PSD - {stem}')
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(paths, out_dir=None, max_workers=None, plot=True, use_cache=True, table_format='csv', **params):
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(process_file, path, out_dir, plot, use_cache, table_format, **params)
+                   for path in paths]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            status = result['error'] or f"{result['seconds']:.2f} s"
+            print(f"[{done}/{len(paths)}] {result['file']}: {status}")
+    print_summary(results, time.perf_counter() - start)
+    return results
+
+
+def print_summary(results, elapsed):
+    ok = [r for r in results if r['error'] is None]
+    failed = [r for r in results if r['error'] is not None]
+    megabytes = sum(r['bytes'] for r in ok) / 1e6
+    elapsed = max(elapsed, 1e-9)
+    print(f"\n{len(ok)} files processed, {len(failed)} failed in {elapsed:.2f} s")
+    print(f"Throughput: {len(ok) / elapsed:.2f} files/s, {megabytes / elapsed:.1f} MB/s ({megabytes:.1f} MB)")
+    for r in failed:
+        print(f"  FAILED {r['file']}: {r['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute Welch PSDs of many CSV recordings in parallel.")
+    parser.add_argument('inputs', nargs='+', help="CSV files, directories or glob patterns")
+    parser.add_argument('-o', '--out-dir', help="output directory (default: next to each input)")
+    parser.add_argument('--fs', type=float, default=1.0, help="sampling frequency in Hz")
+    parser.add_argument('--window', default='hann')
+    parser.add_argument('--nperseg', type=int, default=256)
+    parser.add_argument('--noverlap', type=int)
+    parser.add_argument('--nfft', type=int)
+    parser.add_argument('--sensitivity', type=float, default=1.0, help="sensor sensitivity, signal units per g")
+    parser.add_argument('--columns', type=int, nargs='+', help="column indices (default: all but the first)")
+    parser.add_argument('--float32', action='store_true', help="load and transform in float32")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--format', choices=['csv', 'npz', 'parquet', 'h5'], default='csv',
+                        help="PSD table format (default: csv)")
+    parser.add_argument('--no-plots', action='store_true', help="write PSD tables only")
+    parser.add_argument('--no-cache', action='store_true', help="ignore the on-disk PSD cache")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("no CSV files matched")
+
+    results = run_batch(paths, out_dir=args.out_dir, max_workers=args.workers, plot=not args.no_plots,
+                        use_cache=not args.no_cache, table_format=args.format, columns=args.columns, fs=args.fs,
+                        window=args.window, nperseg=args.nperseg, noverlap=args.noverlap, nfft=args.nfft,
+                        sensitivity=args.sensitivity, dtype=np.float32 if args.float32 else np.float64)
+    return 1 if any(r['error'] for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from scipy.signal import welch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from psd_engine import welch_channels
+
+# Welch on one long channel with an increasing number of worker threads,
+# compared against a single scipy.signal.welch call.
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark threaded Welch against core count.")
+    parser.add_argument('--samples', type=int, default=1 << 24)
+    parser.add_argument('--nperseg', type=int, default=4096)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dtype', default='float64')
+    args = parser.parse_args()
+
+    x = np.random.default_rng(0).standard_normal(args.samples).astype(args.dtype)
+    baseline = best_time(lambda: welch(x, nperseg=args.nperseg), args.repeat)
+    print(f"{args.samples} samples, nperseg={args.nperseg}, {os.cpu_count()} cores")
+    print(f"{'scipy.signal.welch':>20} {baseline:8.3f} s")
+
+    counts = sorted({1, 2, 4, 8, 16, 32, os.cpu_count() or 1})
+    for workers in [w for w in counts if w <= (os.cpu_count() or 1)]:
+        elapsed = best_time(lambda: welch_channels(x, nperseg=args.nperseg, workers=workers), args.repeat)
+        print(f"{f'workers={workers}':>20} {elapsed:8.3f} s  speed-up x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Cold import cost of each module PSDPlotterApp depends on, measured in a
+# fresh interpreter with -X importtime so earlier imports don't hide the cost.
+# Modules loaded before the window appears are marked "startup".
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+EXPORT_SCRIPT = os.path.join(REPO_ROOT, 'main project', 'chapter3', 'export.py')
+
+MODULES = [
+    ('tkinter', 'startup'),
+    ('matplotlib.backends.backend_tkagg', 'startup'),
+    ('matplotlib.widgets', 'startup'),
+    ('numpy', 'startup'),
+    ('pandas', 'lazy'),
+    ('scipy.signal', 'lazy'),
+    ('scipy.fft', 'lazy'),
+    ('PIL.Image', 'lazy'),
+    ('docx', 'lazy'),
+]
+
+# Import export.py without running its mainloop
+EXPORT_SNIPPET = (
+    "import importlib.util, sys\n"
+    "spec = importlib.util.spec_from_file_location('export', {path!r})\n"
+    "module = importlib.util.module_from_spec(spec)\n"
+    "spec.loader.exec_module(module)\n"
+    "print(' '.join(m for m in ('pandas', 'scipy', 'docx') if m in sys.modules))\n"
+)
+
+
+def import_cost(code):
+    # Returns (cumulative microseconds of the outermost import, stdout),
+    # or (None, error text) if the import failed
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level entries are the ones without indentation in the name column
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total, proc.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import cost of the PSD plotter's dependencies.")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per module; the fastest is reported")
+    args = parser.parse_args()
+
+    print(f"{'module':40} {'phase':8} {'ms':>8}")
+    startup_total = 0.0
+    for name, phase in MODULES:
+        runs = [import_cost(f'import {name}') for _ in range(args.repeat)]
+        times = [us for us, _ in runs if us is not None]
+        if not times:
+            print(f"{name:40} {phase:8} {'n/a':>8}  ({runs[0][1]})")
+            continue
+        ms = min(times) / 1000
+        if phase == 'startup':
+            startup_total += ms
+        print(f"{name:40} {phase:8} {ms:8.1f}")
+
+    runs = [import_cost(EXPORT_SNIPPET.format(path=EXPORT_SCRIPT)) for _ in range(args.repeat)]
+    times = [us for us, _ in runs if us is not None]
+    if times:
+        print(f"{'export.py (before window)':40} {'startup':8} {min(times) / 1000:8.1f}")
+        heavy = runs[0][1]
+        print(f"heavy modules loaded at startup: {heavy or 'none'}")
+    else:
+        print(f"export.py import failed: {runs[0][1]}")
+    print(f"sum of startup dependencies: {startup_total:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sidecar import load_numeric_columns
+from psd_engine import welch_channels
+from lod import MinMaxPyramid
+from report_export import init_agg_worker, render_figure, build_docx
+
+# One report per test article, with g-level and PSD plots for every channel
+# and every flagged time range, for a whole campaign at once. Each recording
+# is analysed once (PSDs of the full record and of every range any report
+# asks for) in a process pool; the reports are then laid out and rendered in
+# the same pool from those shared results.
+#
+#   python campaign_report.py campaign.json --workers 8
+#
+# Manifest (paths are relative to the manifest; ranges are in seconds):
+#   {"fs": 2000, "nperseg": 4096, "sensitivity": 0.1, "columns": [1, 2, 3],
+#    "format": "docx", "out_dir": "reports",
+#    "reports": [{"name": "Article 12",
+#                 "files": [{"path": "run1.csv", "ranges": [[1.5, 4.0]]}]}]}
+
+WELCH_KEYS = ('fs', 'window', 'nperseg', 'noverlap', 'nfft')
+DEFAULTS = {'fs': 1.0, 'window': 'hann', 'nperseg': 256, 'noverlap': None, 'nfft': None, 'sensitivity': 1.0,
+            'columns': None, 'format': 'docx', 'out_dir': 'reports', 'dpi': 150}
+ENVELOPE_BUCKETS = 2000  # min/max columns per g-level trace, whatever the record length
+
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    settings = {**DEFAULTS, **{k: v for k, v in manifest.items() if k != 'reports'}}
+    base = os.path.dirname(os.path.abspath(path))
+    settings['out_dir'] = os.path.join(base, settings['out_dir'])
+    reports = []
+    for report in manifest['reports']:
+        files = []
+        for entry in report['files']:
+            files.append({'path': os.path.join(base, entry['path']),
+                          'ranges': [tuple(r) for r in entry.get('ranges', [])],
+                          'sensitivity': entry.get('sensitivity', settings['sensitivity'])})
+        reports.append({'name': report['name'], 'files': files})
+    return settings, reports
+
+
+def analyse_file(path, columns, ranges, welch_params):
+    # Runs in a worker process. PSDs are unscaled (sensitivity is applied when
+    # plotting, so files shared by reports with different sensors still match).
+    names, values = load_numeric_columns(path)
+    columns = list(columns) if columns is not None else list(range(1, len(names)))
+    fs = welch_params['fs']
+    n = values.shape[1]
+
+    psd = {None: welch_channels(values[columns], axis=-1, **welch_params)}
+    for r in ranges:
+        start, stop = max(0, int(round(r[0] * fs))), min(n, int(round(r[1] * fs)))
+        if stop - start >= 2:
+            psd[r] = welch_channels(values[columns, start:stop], axis=-1, **welch_params)
+
+    envelopes = []
+    for c in columns:
+        x, y = MinMaxPyramid(values[c]).envelope(0, n, ENVELOPE_BUCKETS)
+        envelopes.append((x / fs, y))
+    return {'names': [names[c] for c in columns], 'psd': psd, 'envelopes': envelopes}
+
+
+def glevel_figure(title, analysis, ranges, sensitivity):
+    from matplotlib.figure import Figure
+    names = analysis['names']
+    fig = Figure(figsize=(8, 2.2 * len(names)), layout='constrained')
+    axs = fig.subplots(len(names), 1, squeeze=False)[:, 0]
+    for ax, name, (t, y) in zip(axs, names, analysis['envelopes']):
+        ax.plot(t, y * (1.0 / sensitivity), linewidth=0.6)
+        for start, stop in ranges:
+            ax.axvspan(start, stop, color='tab:orange', alpha=0.25)
+        ax.set_ylabel(f'{name} (g)')
+    axs[0].set_title(title)
+    axs[-1].set_xlabel('Time (s)')
+    return fig
+
+
+def psd_figure(title, analysis, key, sensitivity):
+    from matplotlib.figure import Figure
+    names = analysis['names']
+    f, Pxx = analysis['psd'][key]
+    fig = Figure(figsize=(8, 2.2 * len(names)), layout='constrained')
+    axs = fig.subplots(len(names), 1, squeeze=False, sharex=True)[:, 0]
+    for ax, name, P in zip(axs, names, Pxx):
+        ax.semilogy(f, P * (1.0 / sensitivity ** 2), linewidth=0.8)
+        ax.set_ylabel(f'{name} (g²/Hz)')
+        ax.grid(True, which='both', alpha=0.3)
+    axs[0].set_title(title)
+    axs[-1].set_xlabel('Frequency (Hz)')
+    return fig
+
+
+def report_figures(report, analyses):
+    # (heading, figure) pairs, created lazily so only one figure is alive at a time
+    for entry in report['files']:
+        analysis = analyses[entry['path']]
+        stem = os.path.basename(entry['path'])
+        yield f'{stem}: g-levels', glevel_figure(stem, analysis, entry['ranges'], entry['sensitivity'])
+        for key in [None] + entry['ranges']:
+            if key not in analysis['psd']:
+                continue
+            span = 'full record' if key is None else f't = {key[0]:g} - {key[1]:g} s'
+            yield f'{stem}: PSD, {span}', psd_figure(f'{stem} ({span})', analysis, key, entry['sensitivity'])
+
+
+def build_report(report, analyses, out_dir, fmt, dpi):
+    # Runs in a worker process
+    path = os.path.join(out_dir, f"{report['name']}.{fmt}")
+    if fmt == 'pdf':
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(path) as pdf:
+            for _, fig in report_figures(report, analyses):
+                pdf.savefig(fig)
+    else:
+        sections = [(heading, render_figure(fig, 'png', dpi)) for heading, fig in report_figures(report, analyses)]
+        build_docx(sections, title=report['name'], width=6.0).save(path)
+    return path
+
+
+def run_campaign(settings, reports, max_workers=None):
+    os.makedirs(settings['out_dir'], exist_ok=True)
+    welch_params = {k: settings[k] for k in WELCH_KEYS}
+
+    # Every range any report flags on a file, so each file is read and analysed once
+    file_ranges = {}
+    for report in reports:
+        for entry in report['files']:
+            file_ranges.setdefault(entry['path'], set()).update(entry['ranges'])
+
+    start = time.perf_counter()
+    analyses, failed = {}, []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=init_agg_worker) as pool:
+        futures = {pool.submit(analyse_file, path, settings['columns'], sorted(ranges), welch_params): path
+                   for path, ranges in file_ranges.items()}
+        for future in as_completed(futures):
+            try:
+                analyses[futures[future]] = future.result()
+            except Exception as e:
+                failed.append((futures[future], f"{type(e).__name__}: {e}"))
+        analysed = time.perf_counter()
+
+        ready = [r for r in reports if all(entry['path'] in analyses for entry in r['files'])]
+        skipped = [r['name'] for r in reports if r not in ready]
+        futures = {pool.submit(build_report, r, {e['path']: analyses[e['path']] for e in r['files']},
+                               settings['out_dir'], settings['format'], settings['dpi']): r['name']
+                   for r in ready}
+        written = []
+        for future in as_completed(futures):
+            try:
+                written.append(future.result())
+                print(f"[{len(written)}/{len(ready)}] {written[-1]}")
+            except Exception as e:
+                failed.append((futures[future], f"{type(e).__name__}: {e}"))
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"\n{len(analyses)} files analysed in {analysed - start:.2f} s, "
+          f"{len(written)} reports written in {elapsed:.2f} s ({len(written) * 3600 / elapsed:.0f} reports/hour)")
+    for name in skipped:
+        print(f"  SKIPPED {name}: a recording could not be analysed")
+    for name, error in failed:
+        print(f"  FAILED {name}: {error}")
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build g-level/PSD reports for a test campaign.")
+    parser.add_argument('manifest', help="JSON manifest of reports, files and time ranges")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--format', choices=['docx', 'pdf'], help="override the manifest's report format")
+    args = parser.parse_args(argv)
+
+    settings, reports = load_manifest(args.manifest)
+    if args.format:
+        settings['format'] = args.format
+    _, failed = run_campaign(settings, reports, max_workers=args.workers)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
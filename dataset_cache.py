@@ -0,0 +1,86 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from sidecar import load_numeric_columns
+from fingerprint import fingerprint
+
+
+class Dataset:
+    def __init__(self, file_path, columns, values):
+        self.file_path = file_path
+        self.columns = columns
+        # One contiguous row per channel: values[i] is column i of the CSV
+        self.values = values
+        # Sensor sensitivity (V/g) is never applied to values; consumers scale
+        # what they display: g-levels by 1/s, PSD bins by 1/s**2
+        self.sensitivity = 1.0
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @property
+    def n_samples(self):
+        return self.values.shape[1]
+
+    def channel(self, index):
+        return self.values[index]
+
+    @property
+    def g_scale(self):
+        return 1.0 / self.sensitivity
+
+
+def dataset_key(file_path, dtype=np.float64):
+    # Content-based, so a copied or renamed recording maps to the same key
+    return fingerprint(file_path), np.dtype(dtype).str
+
+
+class DatasetCache:
+    # LRU cache of parsed recordings keyed by (content fingerprint, dtype),
+    # bounded by the total bytes of the channel arrays it holds
+    def __init__(self, max_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_path, dtype=np.float64):
+        # dtype=np.float32 halves the memory of a recording (and of every
+        # computation that starts from it)
+        key = dataset_key(file_path, dtype)
+        dataset = self._entries.get(key)
+        if dataset is not None:
+            self._entries.move_to_end(key)
+            return dataset
+
+        # Text columns (e.g. timestamps) become NaN, so channel indices still match the CSV
+        columns, values = load_numeric_columns(file_path, dtype=dtype)
+        # Copy out of the memmap so later plots never touch the disk again
+        dataset = Dataset(file_path, columns, np.array(values, order='C'))
+        self._discard_stale(file_path, key)
+        self._insert(key, dataset)
+        return dataset
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _discard_stale(self, file_path, new_key):
+        # A file that changed on disk leaves a stale entry under its old key
+        path = os.path.abspath(file_path)
+        stale = [k for k, d in self._entries.items()
+                 if os.path.abspath(d.file_path) == path and k[0] != new_key[0]]
+        for key in stale:
+            self.nbytes -= self._entries.pop(key).nbytes
+
+    def _insert(self, key, dataset):
+        if dataset.nbytes > self.max_bytes:
+            return
+        while self._entries and self.nbytes + dataset.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        self._entries[key] = dataset
+        self.nbytes += dataset.nbytes
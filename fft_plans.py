@@ -0,0 +1,49 @@
+from functools import lru_cache
+import numpy as np
+import scipy.fft
+from scipy.signal import get_window
+
+
+class WelchPlan:
+    # Everything about a Welch run that depends only on (window, nperseg, nfft,
+    # dtype): the window array, its normalisation sums and the rfft call with
+    # its length and worker count fixed. pocketfft keeps its own twiddle-factor
+    # cache per length, so reusing one nfft also reuses that setup.
+    def __init__(self, window, nperseg, nfft=None, dtype=np.float64, workers=None):
+        self.nperseg = nperseg
+        self.nfft = nperseg if nfft is None else nfft
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+        if isinstance(window, (str, tuple)):
+            window = get_window(window, nperseg)
+        self.window = np.asarray(window, dtype=self.dtype)
+        self.window.setflags(write=False)
+        # Kept in float64 whatever the plan dtype
+        w = self.window.astype(np.float64)
+        self.window_power = float((w * w).sum())
+        self.window_sum = float(w.sum())
+
+    def density_scale(self, fs):
+        return 1.0 / (fs * self.window_power)
+
+    def spectrum_scale(self):
+        return 1.0 / self.window_sum ** 2
+
+    def rfft(self, segments):
+        return scipy.fft.rfft(segments, n=self.nfft, axis=-1, workers=self.workers)
+
+
+@lru_cache(maxsize=64)
+def _cached_plan(window, nperseg, nfft, dtype, workers):
+    return WelchPlan(window, nperseg, nfft=nfft, dtype=dtype, workers=workers)
+
+
+def get_plan(window, nperseg, nfft=None, dtype=np.float64, workers=None):
+    # Named windows are cached; explicit window arrays get a fresh plan
+    if isinstance(window, (str, tuple)):
+        return _cached_plan(window, nperseg, nperseg if nfft is None else nfft, np.dtype(dtype).str, workers)
+    return WelchPlan(window, nperseg, nfft=nfft, dtype=dtype, workers=workers)
+
+
+def clear_plans():
+    _cached_plan.cache_clear()
@@ -0,0 +1,288 @@
+import functools
+import hashlib
+import pickle
+from collections import OrderedDict
+from io import BytesIO
+import numpy as np
+
+# Raster exports keyed on what the figure shows (data, limits, styles, text)
+# rather than on the Figure object. An unchanged figure is never rendered
+# twice, and when only some axes changed, only those axes are redrawn and
+# pasted into the previous raster of the same layout.
+RASTER_FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'jpg': 'JPEG'}
+MAX_IMAGES = 16
+MAX_COMPOSITES = 2
+REGION_PAD = 2  # pixels around each axes' tight bbox
+
+
+class _Uncovered(Exception):
+    # Figure state the keys cannot read, e.g. a private matplotlib attribute
+    # renamed by an upgrade; such figures are exported without the cache
+    pass
+
+
+def _private(obj, name):
+    try:
+        return getattr(obj, name)
+    except AttributeError:
+        raise _Uncovered(f"{type(obj).__name__}.{name}") from None
+
+
+class _StateHash:
+    def __init__(self):
+        self._h = hashlib.blake2b(digest_size=16)
+
+    def add(self, *values):
+        for value in values:
+            if isinstance(value, np.ndarray):
+                value = np.ascontiguousarray(value)
+                self._h.update(repr((value.dtype.str, value.shape)).encode())
+                self._h.update(value.view(np.uint8).ravel() if value.dtype != object else repr(value.tolist()).encode())
+            else:
+                self._h.update(repr(value).encode())
+                self._h.update(b'\0')
+        return self
+
+    def digest(self):
+        return self._h.hexdigest()
+
+
+def _text_state(h, text, position=True):
+    # Axis labels and titles are positioned at draw time, so their position is left out
+    h.add(text.get_text(), text.get_position() if position else None, text.get_color(), text.get_fontsize(), text.get_rotation(),
+          text.get_visible(), text.get_ha(), text.get_va())
+
+
+# Formatter attributes recomputed from the tick locations at every draw
+_DRAW_TIME_ATTRS = {'_format', 'format', '_orderOfMagnitude', 'orderOfMagnitude', 'offset', 'locs', '_locs',
+                    '_sublabels'}
+
+
+def _callable_state(func):
+    # FuncFormatter callables: set_ticklabels() makes a partial over the label dict
+    if isinstance(func, functools.partial):
+        return _callable_state(func.func), func.args, sorted(func.keywords.items())
+    code = getattr(func, '__code__', None)
+    cells = [c.cell_contents for c in getattr(func, '__closure__', None) or ()]
+    return getattr(func, '__qualname__', type(func).__name__), code and (code.co_code, code.co_consts), cells
+
+
+def _ticker_state(ticker, skip=()):
+    # Locators and formatters hold a reference to their axis, so only their own settings count
+    state = {}
+    for k, v in vars(ticker).items():
+        if k in skip:
+            continue
+        if isinstance(v, (str, int, float, bool, tuple, list, np.ndarray)) or v is None:
+            state[k] = np.asarray(v).tolist() if isinstance(v, np.ndarray) else v
+        elif callable(v) and k == 'func':
+            state[k] = _callable_state(v)
+    return type(ticker).__name__, sorted(state.items())
+
+
+def _spine_state(h, ax):
+    for name, spine in ax.spines.items():
+        h.add('spine', name, spine.get_visible(), spine.get_edgecolor(), spine.get_linewidth(),
+              spine.get_linestyle(), spine.get_position(), spine.get_bounds(), spine.get_zorder())
+
+
+def axes_key(ax):
+    # Raises _Uncovered when some state cannot be read
+    h = _StateHash()
+    h.add(ax.get_position().bounds, ax.get_xlim(), ax.get_ylim(), ax.get_xscale(), ax.get_yscale(),
+          ax.get_facecolor(), ax.get_visible(), ax.axison, ax.get_frame_on(), ax.get_aspect())
+    for axis in (ax.xaxis, ax.yaxis):
+        h.add(_ticker_state(axis.get_major_formatter(), _DRAW_TIME_ATTRS), _ticker_state(axis.get_major_locator()),
+              _ticker_state(axis.get_minor_formatter(), _DRAW_TIME_ATTRS), _ticker_state(axis.get_minor_locator()),
+              sorted(_private(axis, '_major_tick_kw').items()), sorted(_private(axis, '_minor_tick_kw').items()),
+              axis.get_visible(), axis.get_label_position(), axis.get_ticks_position())
+        _text_state(h, axis.label, position=False)
+    _spine_state(h, ax)
+    for title in (ax.title, _private(ax, '_left_title'), _private(ax, '_right_title')):
+        _text_state(h, title, position=False)
+
+    for line in ax.lines:
+        h.add('line', line.get_xydata(), line.get_color(), line.get_linewidth(), line.get_linestyle(),
+              line.get_marker(), line.get_markersize(), line.get_alpha(), line.get_zorder(), line.get_visible(),
+              line.get_drawstyle())
+    for patch in ax.patches:
+        h.add('patch', type(patch).__name__, patch.get_verts(), patch.get_facecolor(), patch.get_edgecolor(),
+              patch.get_linewidth(), patch.get_zorder(), patch.get_visible())
+    for coll in ax.collections:
+        h.add('collection', type(coll).__name__, coll.get_offsets(), coll.get_facecolor(), coll.get_edgecolor(),
+              coll.get_linewidths(), coll.get_zorder(), coll.get_visible())
+        for path in coll.get_paths():
+            h.add(path.vertices)
+    for image in ax.images:
+        h.add('image', np.asarray(image.get_array()), image.get_extent(), image.get_cmap().name,
+              image.get_clim(), image.get_visible())
+    for text in ax.texts:
+        _text_state(h, text)
+    legend = ax.get_legend()
+    if legend is not None:
+        h.add('legend', [t.get_text() for t in legend.get_texts()], _private(legend, '_loc'), legend.get_visible())
+    return h.digest()
+
+
+def layout_key(fig, dpi, fmt, savefig_kwargs):
+    # Everything outside the axes; a change here re-renders the whole figure
+    h = _StateHash()
+    h.add(tuple(fig.get_size_inches()), dpi, fmt, sorted(savefig_kwargs.items()), fig.get_facecolor(),
+          len(fig.axes), vars(fig.subplotpars), type(fig.get_layout_engine()).__name__)
+    for text in fig.texts:
+        _text_state(h, text)
+    suptitle = _private(fig, '_suptitle')
+    if suptitle is not None:
+        _text_state(h, suptitle)
+    h.add(len(fig.legends), len(fig.images), len(fig.lines), len(fig.patches))
+    return h.digest()
+
+
+class FigureExportCache:
+    def __init__(self, max_images=MAX_IMAGES):
+        self.max_images = max_images
+        self._images = OrderedDict()      # (layout, axes keys) -> encoded bytes
+        self._composites = OrderedDict()  # layout -> (rgba, axes keys, regions)
+        self.hits = 0
+        self.partial_renders = 0
+        self.full_renders = 0
+
+    def export(self, fig, fmt='png', dpi=300, **savefig_kwargs):
+        # Encoded image bytes. fig may be a Figure or pickle.dumps() of one; a
+        # live Figure is left as it was found. Vector formats and savefig options
+        # other than bbox_inches/pad_inches go straight to savefig. Figures laid
+        # out or cropped at draw time (a layout engine, bbox_inches='tight') are
+        # cached whole but never composited: a change to one axes can move the others.
+        fmt = fmt.lower()
+        if isinstance(fig, bytes):
+            fig = pickle.loads(fig)
+        if fmt not in RASTER_FORMATS or set(savefig_kwargs) - {'bbox_inches', 'pad_inches'}:
+            return _savefig(fig, fmt, dpi, savefig_kwargs)
+
+        try:
+            layout = layout_key(fig, dpi, fmt, savefig_kwargs)
+            keys = tuple(axes_key(ax) for ax in fig.axes)
+        except _Uncovered:
+            # Never guess: a figure the keys cannot describe is rendered afresh
+            return _savefig(fig, fmt, dpi, savefig_kwargs)
+        image = self._images.get((layout, keys))
+        if image is not None:
+            self._images.move_to_end((layout, keys))
+            self.hits += 1
+            return image
+
+        if fig.get_layout_engine() is not None or savefig_kwargs.get('bbox_inches') is not None:
+            image = _savefig(fig, fmt, dpi, savefig_kwargs)
+            self.full_renders += 1
+        else:
+            image = _encode(self._rasterise(fig, layout, keys, dpi), RASTER_FORMATS[fmt], dpi)
+        self._images[(layout, keys)] = image
+        while len(self._images) > self.max_images:
+            self._images.popitem(last=False)
+        return image
+
+    def clear(self):
+        self._images.clear()
+        self._composites.clear()
+
+    def _rasterise(self, fig, layout, keys, dpi):
+        # Like savefig: draw on a temporary Agg canvas, then put back the
+        # figure's own canvas, dpi and axes visibility
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        canvas, old_dpi = fig.canvas, fig.dpi
+        visible = [ax.get_visible() for ax in fig.axes]
+        try:
+            FigureCanvasAgg(fig)
+            fig.dpi = dpi
+            return self._draw(fig, layout, keys, visible)
+        finally:
+            fig.dpi = old_dpi
+            fig.set_canvas(canvas)
+            for ax, was_visible in zip(fig.axes, visible):
+                ax.set_visible(was_visible)
+
+    def _draw(self, fig, layout, keys, visible):
+        canvas = fig.canvas
+        previous = self._composites.get(layout)
+        changed = [i for i, key in enumerate(keys) if previous is None or previous[1][i] != key]
+        if previous is not None and changed:
+            for i, ax in enumerate(fig.axes):
+                ax.set_visible(visible[i] and i in changed)
+            canvas.draw()
+            new_regions = _regions(fig, canvas.get_renderer(), changed)
+            rgba, _, regions = previous
+            regions = dict(regions)
+            paste = [_union(regions[i], new_regions[i]) for i in changed]
+            unchanged = [regions[i] for i in range(len(keys)) if i not in changed]
+            if not any(_overlaps(a, b) for a in paste for b in unchanged):
+                rgba = rgba.copy()
+                buf = np.asarray(canvas.buffer_rgba())
+                for i, box in zip(changed, paste):
+                    if box is not None:
+                        x0, y0, x1, y1 = box
+                        rgba[y0:y1, x0:x1] = buf[y0:y1, x0:x1]
+                    regions[i] = new_regions[i]
+                self.partial_renders += 1
+                self._store(layout, rgba, keys, regions)
+                return rgba
+            for ax, was_visible in zip(fig.axes, visible):
+                ax.set_visible(was_visible)
+
+        canvas.draw()
+        renderer = canvas.get_renderer()
+        rgba = np.asarray(canvas.buffer_rgba()).copy()
+        self.full_renders += 1
+        self._store(layout, rgba, keys, _regions(fig, renderer, range(len(keys))))
+        return rgba
+
+    def _store(self, layout, rgba, keys, regions):
+        self._composites[layout] = (rgba, keys, regions)
+        self._composites.move_to_end(layout)
+        while len(self._composites) > MAX_COMPOSITES:
+            self._composites.popitem(last=False)
+
+
+def _savefig(fig, fmt, dpi, savefig_kwargs):
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, **savefig_kwargs)
+    return buf.getvalue()
+
+
+def _pixel_box(bbox, shape, pad=REGION_PAD):
+    # Display bbox (origin bottom-left) -> (x0, y0, x1, y1) rows/cols of the buffer
+    height, width = shape[:2]
+    x0 = max(0, int(np.floor(bbox.x0 - pad)))
+    x1 = min(width, int(np.ceil(bbox.x1 + pad)))
+    y0 = max(0, int(np.floor(height - bbox.y1 - pad)))
+    y1 = min(height, int(np.ceil(height - bbox.y0 + pad)))
+    return x0, y0, x1, y1
+
+
+def _regions(fig, renderer, indices):
+    # Pixel box of each listed (visible) axes, labels and ticks included
+    # (None for hidden axes)
+    shape = (int(round(fig.bbox.height)), int(round(fig.bbox.width)))
+    boxes = {i: fig.axes[i].get_tightbbox(renderer) for i in indices}
+    return {i: None if bbox is None else _pixel_box(bbox, shape) for i, bbox in boxes.items()}
+
+
+def _union(a, b):
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _overlaps(a, b):
+    if a is None or b is None:
+        return False
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _encode(rgba, pil_format, dpi):
+    from PIL import Image
+    image = Image.fromarray(np.ascontiguousarray(rgba), 'RGBA')
+    if pil_format == 'JPEG':
+        image = image.convert('RGB')
+    buf = BytesIO()
+    image.save(buf, pil_format, dpi=(dpi, dpi))
+    return buf.getvalue()
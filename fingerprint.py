@@ -0,0 +1,47 @@
+import mmap
+import os
+import zlib
+
+# Content fingerprints of recordings, used as cache keys so a copied or renamed
+# file still hits. The default samples SAMPLE_BLOCKS evenly spaced blocks of
+# BLOCK_SIZE bytes (always including the first and last) and hashes them with
+# CRC-32. A sample cannot see a same-size edit between the blocks, so sampled
+# fingerprints also carry the mtime (copies made with cp -p or rsync -a keep
+# it and still hit). full=True hashes every byte and needs neither.
+SAMPLE_BLOCKS = 16
+BLOCK_SIZE = 1 << 16
+FULL_CHUNK = 1 << 24
+
+# (abspath, size, mtime_ns, full) -> fingerprint, so an unchanged file is never re-read
+_memo = {}
+
+
+def fingerprint(path, full=False):
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, full)
+    result = _memo.get(memo_key)
+    if result is None:
+        result = _compute(path, st.st_size, st.st_mtime_ns, full)
+        _memo[memo_key] = result
+    return result
+
+
+def _compute(path, size, mtime_ns, full):
+    crc = 0
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_BLOCKS * BLOCK_SIZE or full:
+            # Small files are hashed whole; sampling would read most of them anyway
+            for chunk in iter(lambda: f.read(FULL_CHUNK), b''):
+                crc = zlib.crc32(chunk, crc)
+            return f"f{size:x}-{crc:08x}"
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            step = (size - BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                start = i * step
+                crc = zlib.crc32(m[start:start + BLOCK_SIZE], crc)
+    return f"s{size:x}-{mtime_ns:x}-{crc:08x}"
+
+
+def clear_memo():
+    _memo.clear()
@@ -1,28 +1,28 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import pandas as pd
-from scipy.signal import welch, get_window
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-def read_csv(file_path):
-    try:
-        data = pd.read_csv(file_path)
-        return data
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        return None
+from dataset_cache import DatasetCache, dataset_key
+from welch_stream import streaming_welch
+from psd_engine import welch_channels
+from segment_index import SegmentIndex
+from lod import LODLine
+from plot_artists import LinePlotter
+from pipeline import RecomputeGraph
+from psd_cache import PSDCache, cache_key, pack_spectra, unpack_spectra
+from psd_export import write_psd
 
 def plot_glevel(ax, x, sensitivity, title):
-    g_levels = x / sensitivity
-    ax.plot(g_levels)
+    # Min/max envelope that re-decimates on zoom, instead of every sample;
+    # the 1/sensitivity scaling is applied to the decimated points only
+    line = LODLine(ax, x, scale=1 / sensitivity)
     ax.set_xlabel('Time')
     ax.set_ylabel('g-levels')
     ax.set_title(title)
+    return line
 
-def plot_psd(ax, x, fs, nperseg, noverlap, nfft, window, title):
-    f, Pxx = welch(x, fs=fs, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window=window)
-    ax.semilogy(f, Pxx)
+def format_psd_axes(ax, title):
     ax.set_xlabel('Frequency (Hz)')
     ax.set_ylabel('Power/Frequency (dB/Hz)')
     ax.set_title(title)
@@ -32,6 +32,20 @@ class PSDPlotterApp:
         self.root = root
         self.root.title("PSD Plotter")
 
+        # Parsed recordings, so re-plotting the same file skips the CSV entirely
+        self.datasets = DatasetCache()
+
+        # load -> select -> Welch -> scale stages, each rerun only when its inputs change
+        self.pipeline = RecomputeGraph()
+        # Spectra computed in earlier sessions, so reopening a file skips Welch
+        self.psd_cache = PSDCache()
+        self.build_pipeline()
+        self.rendered_psd = None
+
+        # LOD lines of the g-level plots; the axes only hold them weakly
+        self.glevel_lines = [None] * 3
+        self.glevel_sources = [None] * 3
+
         # Colorful style
         style = ttk.Style()
         style.configure("TFrame", background="#ececec")
@@ -74,11 +88,23 @@ class PSDPlotterApp:
         self.sensitivity_label.grid(row=6, column=0, pady=5, padx=10, sticky="w")
         self.sensitivity_entry = ttk.Entry(root)
         self.sensitivity_entry.grid(row=6, column=1, pady=5, padx=10, sticky="w")
+        self.sensitivity_entry.bind("<Return>", self.apply_sensitivity)
+        self.sensitivity_entry.bind("<FocusOut>", self.apply_sensitivity)
 
         self.range_checkbox_var = tk.IntVar()
         self.range_checkbox = ttk.Checkbutton(root, text="Enable Range Selection", variable=self.range_checkbox_var)
         self.range_checkbox.grid(row=7, column=0, columnspan=2, pady=5, padx=10, sticky="w")
 
+        # Streaming reads the CSV in chunks, for recordings too large to load
+        self.streaming_var = tk.IntVar()
+        self.streaming_checkbox = ttk.Checkbutton(root, text="Streaming Mode (large files)", variable=self.streaming_var)
+        self.streaming_checkbox.grid(row=7, column=2, pady=5, padx=10, sticky="w")
+
+        # Float32 halves memory and bandwidth; the averaged PSD is still float64
+        self.float32_var = tk.IntVar()
+        self.float32_checkbox = ttk.Checkbutton(root, text="Float32 Mode", variable=self.float32_var)
+        self.float32_checkbox.grid(row=8, column=2, pady=5, padx=10, sticky="w")
+
         self.glevel_range_label = ttk.Label(root, text="Select G-level Range:")
         self.glevel_range_label.grid(row=8, column=0, pady=5, padx=10, sticky="w")
 
@@ -95,6 +121,9 @@ class PSDPlotterApp:
         self.canvas_widget = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
         self.canvas_widget.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
 
+        # PSD lines are created once and then updated in place
+        self.plotter = LinePlotter(self.canvas_widget)
+
         # Initialize g-level range variables
         self.glevel_ranges = [(0, 100)] * 3
 
@@ -114,12 +143,24 @@ class PSDPlotterApp:
         self.plot_psd_button = ttk.Button(root, text="Plot PSD", command=self.plot_psd)
         self.plot_psd_button.grid(row=11, column=0, pady=10, padx=10, sticky="w")
 
+        self.plot_glevels_button = ttk.Button(root, text="Plot G-levels", command=self.plot_glevels)
+        self.plot_glevels_button.grid(row=12, column=0, pady=10, padx=10, sticky="w")
+
         self.window_type_label = ttk.Label(root, text="Window Type (default: 'hann'):")
         self.window_type_label.grid(row=11, column=1, pady=5, padx=10, sticky="w")
 
         self.window_type_entry = ttk.Entry(root)
         self.window_type_entry.grid(row=11, column=2, pady=5, padx=10, sticky="w")
 
+        self.workers_label = ttk.Label(root, text="FFT Threads (default: all cores):")
+        self.workers_label.grid(row=12, column=1, pady=5, padx=10, sticky="w")
+
+        self.workers_entry = ttk.Entry(root)
+        self.workers_entry.grid(row=12, column=2, pady=5, padx=10, sticky="w")
+
+        self.export_psd_button = ttk.Button(root, text="Export PSD Data", command=self.export_psd_data)
+        self.export_psd_button.grid(row=13, column=0, pady=10, padx=10, sticky="w")
+
     def browse_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
         self.file_path_entry.config(state="normal")
@@ -127,22 +168,146 @@ class PSDPlotterApp:
         self.file_path_entry.insert(0, file_path)
         self.file_path_entry.config(state="disabled")
 
+    def working_dtype(self):
+        return np.float32 if self.float32_var.get() else np.float64
+
+    def load_data(self, file_path, dtype=None):
+        try:
+            return self.datasets.get(file_path, dtype=dtype or self.working_dtype())
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return None
+
+    def build_pipeline(self):
+        channels = [1, 2, 3]
+
+        def load(get):
+            # source carries the content fingerprint, so an edited file is reloaded
+            file_path, _, dtype = get('source')
+            return self.load_data(file_path, np.dtype(dtype))
+
+        # A recording that failed to load leaves 'data' as None, which every
+        # stage after it passes on instead of raising
+        def full_psd(get):
+            # All channels go through a single vectorised welch call
+            data = get('data')
+            if data is None:
+                return None
+            fs, window_type, nperseg, noverlap, nfft = get('welch')
+            f, Pxx = welch_channels(data.values[channels], fs=fs, window=window_type, nperseg=nperseg,
+                                    noverlap=noverlap, nfft=nfft, axis=-1, workers=get('workers'),
+                                    dtype=data.values.dtype)
+            return [(f, Pxx[i]) for i in range(3)]
+
+        def streamed_psd(get):
+            file_path, _, dtype = get('source')
+            fs, window_type, nperseg, noverlap, nfft = get('welch')
+            f, Pxx = streaming_welch(file_path, channels, fs=fs, window=window_type, nperseg=nperseg,
+                                     noverlap=noverlap, nfft=nfft, workers=get('workers'), dtype=np.dtype(dtype))
+            return [(f, Pxx[:, i]) for i in range(3)]
+
+        def segment_index(get):
+            # Per-segment spectra of the whole file, for instant range PSDs
+            data = get('data')
+            if data is None:
+                return None
+            fs, window_type, nperseg, noverlap, nfft = get('welch')
+            return SegmentIndex(data.values[channels].T, fs=fs, window=window_type, nperseg=nperseg,
+                                noverlap=noverlap, nfft=nfft, workers=get('workers'), dtype=data.values.dtype)
+
+        def range_psd(get):
+            # Each range is answered from the per-segment index of the whole file
+            index = get('segment_index')
+            if index is None:
+                return None
+            spectra = []
+            for i, (glevel_start, glevel_end) in enumerate(get('ranges')):
+                f, Pxx = index.query(glevel_start, glevel_end + 1)
+                spectra.append((f, Pxx[:, i]))
+            return spectra
+
+        def psd(get):
+            # Streaming and in-memory Welch give the same spectra, so they share a cache entry
+            mode = get('mode')
+            ranges = get('ranges') if mode == 'range' else None
+            # Keyed on content, not path, so copies of a recording share entries
+            key = cache_key(get('source')[1:], columns=tuple(channels), welch=get('welch'), ranges=ranges)
+            cached = self.psd_cache.get(key)
+            if cached is not None:
+                return unpack_spectra(cached)
+            # Only a miss reads the recording
+            spectra = get({'full': 'full_psd', 'streaming': 'streamed_psd', 'range': 'range_psd'}[mode])
+            if spectra is not None:
+                self.psd_cache.put(key, **pack_spectra(spectra))
+            return spectra
+
+        def display(get):
+            # Spectra stay unscaled upstream; the PSD of g = v / s is Pxx / s**2
+            spectra = get('psd')
+            if spectra is None:
+                return None
+            scale = 1.0 / get('sensitivity') ** 2
+            return [(f, Pxx * scale) for f, Pxx in spectra]
+
+        for name, fn in [('data', load), ('full_psd', full_psd), ('streamed_psd', streamed_psd),
+                         ('segment_index', segment_index), ('range_psd', range_psd), ('psd', psd),
+                         ('display', display)]:
+            self.pipeline.stage(name, fn)
+
+    def set_source(self, file_path):
+        try:
+            self.pipeline.set(source=(file_path,) + dataset_key(file_path, self.working_dtype()))
+        except OSError as e:
+            print(f"Error reading CSV file: {e}")
+            return False
+        return True
+
     def plot_glevels(self):
         file_path = self.file_path_entry.get()
         sensitivity = float(self.sensitivity_entry.get())
 
-        data = read_csv(file_path)
+        data = self.pipeline.get('data') if self.set_source(file_path) else None
 
         if data is not None:
+            data.sensitivity = sensitivity
             for i in range(3):
                 column_index = i + 1
-                x = data.iloc[:, column_index].values
+
+                # Same channel as last time: only the scale changes
+                if self.glevel_sources[i] == (data, column_index):
+                    self.glevel_lines[i].set_scale(data.g_scale)
+                    continue
 
                 # Plot g-levels
-                plot_glevel(self.axs[0, i], x, sensitivity, f'G-levels Plot {i + 1}')
+                if self.glevel_lines[i] is not None:
+                    self.glevel_lines[i].remove()
+                x = data.channel(column_index)
+                self.glevel_lines[i] = plot_glevel(self.axs[0, i], x, data.sensitivity, f'G-levels Plot {i + 1}')
+                self.glevel_sources[i] = (data, column_index)
 
             self.canvas_widget.draw()
 
+    def current_sensitivity(self):
+        # None while the entry is empty or half-typed
+        try:
+            return float(self.sensitivity_entry.get())
+        except ValueError:
+            return None
+
+    def apply_sensitivity(self, event=None):
+        # Re-render g-levels and PSDs at the new sensitivity; only the scaling reruns
+        sensitivity = self.current_sensitivity()
+        if sensitivity is None:
+            return
+        for i in range(3):
+            if self.glevel_sources[i] is not None:
+                data, _ = self.glevel_sources[i]
+                data.sensitivity = sensitivity
+                self.glevel_lines[i].set_scale(data.g_scale)
+        if self.rendered_psd is not None:
+            self.pipeline.set(sensitivity=sensitivity)
+            self.render_psd()
+
     def plot_psd(self):
         file_path = self.file_path_entry.get()
         fs = float(self.fs_entry.get())
@@ -150,30 +315,75 @@ class PSDPlotterApp:
         noverlap = int(self.noverlap_entry.get())
         nfft = int(self.nfft_entry.get())
         window_type = self.window_type_entry.get() or 'hann'
-
-        data = read_csv(file_path)
-
-        if data is not None:
-            for i in range(3):
-                column_index = i + 1
-                x = data.iloc[:, column_index].values
-
-                if self.range_checkbox_var.get():
-                    # Select the specified g-level range
-                    glevel_start, glevel_end = self.glevel_ranges[i]
-                    x_selected = x[glevel_start:glevel_end + 1]
-                else:
-                    x_selected = x
-
-                # Plot PSD for the selected range
-                plot_psd(self.axs[1, i], x_selected, fs, nperseg, noverlap, nfft,
-                         get_window(window_type, nperseg), f'PSD Plot {i + 1}')
-
-                # Update the displayed range entry
+        workers = int(self.workers_entry.get() or -1)
+
+        if self.range_checkbox_var.get():
+            mode = 'range'
+        elif self.streaming_var.get():
+            mode = 'streaming'
+        else:
+            mode = 'full'
+
+        if not self.set_source(file_path):
+            return
+        self.pipeline.set(welch=(fs, window_type, nperseg, noverlap, nfft), workers=workers, mode=mode,
+                          ranges=tuple(self.glevel_ranges), sensitivity=float(self.sensitivity_entry.get()))
+
+        # The PSD cache is consulted before anything loads the recording
+        try:
+            spectra = self.pipeline.get('display')
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return
+        if spectra is None:
+            return
+        self.render_psd()
+
+        if mode == 'range':
+            # Update the displayed range entries
+            for i, (glevel_start, glevel_end) in enumerate(self.glevel_ranges):
                 self.psd_ranges_entries[i].delete(0, tk.END)
                 self.psd_ranges_entries[i].insert(0, f"{glevel_start} - {glevel_end}")
 
-            self.canvas_widget.draw()
+    def render_psd(self):
+        spectra, version = self.pipeline.resolve('display')
+        if spectra is None or version == self.rendered_psd:
+            return
+        for i, (f, Pxx) in enumerate(spectra):
+            ax = self.axs[1, i]
+            if self.plotter.update(ax, ('psd', i), f, Pxx, plot='semilogy'):
+                format_psd_axes(ax, f'PSD Plot {i + 1}')
+        self.plotter.flush()
+        self.rendered_psd = version
+
+    def export_psd_data(self):
+        if self.rendered_psd is None:
+            messagebox.showerror("Error", "Please plot the PSD before exporting.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[
+            ("CSV files", "*.csv"), ("NumPy archives", "*.npz"), ("Parquet files", "*.parquet"),
+            ("HDF5 files", "*.h5 *.hdf5")])
+        if not file_path:
+            return
+
+        # The spectra on screen, in g**2/Hz, with everything needed to reproduce them
+        spectra = self.pipeline.get('display')
+        f = spectra[0][0]
+        if any(len(g) != len(f) for g, _ in spectra):
+            messagebox.showerror("Error", "The PSDs have different frequency resolutions and cannot share a table.")
+            return
+        fs, window_type, nperseg, noverlap, nfft = self.pipeline.get('welch')
+        file_path_source, content, _ = self.pipeline.get('source')
+        mode = self.pipeline.get('mode')
+        metadata = {'fs': fs, 'nperseg': nperseg, 'noverlap': noverlap, 'nfft': nfft, 'window': window_type,
+                    'sensitivity': self.pipeline.get('sensitivity'),
+                    'range': list(self.pipeline.get('ranges')) if mode == 'range' else None,
+                    'source': file_path_source, 'fingerprint': content, 'units': 'g^2/Hz'}
+        try:
+            write_psd(file_path, f, np.stack([Pxx for _, Pxx in spectra]),
+                      names=[f'PSD Plot {i + 1}' for i in range(len(spectra))], metadata=metadata)
+        except (OSError, ValueError, ImportError) as e:
+            messagebox.showerror("Error", f"Could not export PSD data: {e}")
 
     def on_glevel_click(self, event):
         if event.inaxes in self.axs[0]:
@@ -0,0 +1,93 @@
+import numpy as np
+
+# Each pyramid level merges this many entries of the level below
+LOD_FACTOR = 4
+
+
+class MinMaxPyramid:
+    # Multi-resolution min/max envelopes of a 1-D signal. Level 0 is the raw
+    # signal; level k holds the min and max of every LOD_FACTOR**k samples.
+    def __init__(self, y, factor=LOD_FACTOR):
+        self.y = np.asarray(y)
+        self.factor = factor
+        self.levels = [(self.y, self.y)]
+        mins, maxs = self.y, self.y
+        while len(mins) > factor:
+            pad = (-len(mins)) % factor
+            if pad:
+                mins = np.concatenate([mins, np.repeat(mins[-1:], pad)])
+                maxs = np.concatenate([maxs, np.repeat(maxs[-1:], pad)])
+            mins = mins.reshape(-1, factor).min(axis=1)
+            maxs = maxs.reshape(-1, factor).max(axis=1)
+            self.levels.append((mins, maxs))
+
+    def __len__(self):
+        return len(self.y)
+
+    def envelope(self, start, stop, n_buckets):
+        # (x, y) to draw samples [start, stop) in about n_buckets columns, as a
+        # min/max zigzag per column, so no peak is lost however far out we zoom
+        n = len(self.y)
+        start = max(0, int(np.floor(start)))
+        stop = min(n, int(np.ceil(stop)) + 1)
+        if stop <= start:
+            return np.empty(0), np.empty(0)
+        if stop - start <= 2 * n_buckets:
+            return np.arange(start, stop), self.y[start:stop]
+
+        level = int(np.log(max((stop - start) / n_buckets, 1)) / np.log(self.factor))
+        level = min(level, len(self.levels) - 1)
+        block = self.factor ** level
+        mins, maxs = self.levels[level]
+        i0 = start // block
+        i1 = -(-stop // block)
+        mins, maxs = mins[i0:i1], maxs[i0:i1]
+
+        # Merge whole level entries into buckets; every bucket's extrema are exact
+        edges = np.arange(0, len(mins), max(1, len(mins) // n_buckets))
+        bucket_min = np.minimum.reduceat(mins, edges)
+        bucket_max = np.maximum.reduceat(maxs, edges)
+        x = np.repeat((i0 + edges) * block, 2)
+        y = np.column_stack([bucket_min, bucket_max]).ravel()
+        return x, y
+
+
+class LODLine:
+    # A Line2D that shows a MinMaxPyramid envelope and re-decimates whenever
+    # the axes' x-limits change (zoom or pan). Keep a reference to it: the
+    # axes' callback registry only holds it weakly. scale multiplies the
+    # decimated points only, so e.g. volts -> g never copies the raw signal.
+    # x, if given, holds the (sorted) sample times to plot against instead of
+    # the sample index.
+    def __init__(self, ax, y, scale=1.0, x=None, **plot_kwargs):
+        self.ax = ax
+        self.scale = scale
+        self.x = None if x is None else np.asarray(x)
+        self.pyramid = y if isinstance(y, MinMaxPyramid) else MinMaxPyramid(y)
+        x, y = self.pyramid.envelope(0, len(self.pyramid), self.n_buckets())
+        self.line, = ax.plot(self.to_x(x), y * scale, **plot_kwargs)
+        self._cid = ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+    def n_buckets(self):
+        return max(int(self.ax.get_window_extent().width), 100)
+
+    def to_x(self, index):
+        return index if self.x is None else self.x[index.astype(np.intp)]
+
+    def on_xlim_changed(self, ax):
+        start, stop = ax.get_xlim()
+        if self.x is not None:
+            start, stop = np.searchsorted(self.x, start), np.searchsorted(self.x, stop, side='right')
+        x, y = self.pyramid.envelope(start, stop, self.n_buckets())
+        self.line.set_data(self.to_x(x), y * self.scale)
+
+    def set_scale(self, scale):
+        # Re-render at a new scale from the same pyramid
+        self.scale = scale
+        self.on_xlim_changed(self.ax)
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._cid)
+        self.line.remove()
@@ -1,13 +1,40 @@
+import os
+import pickle
+import sys
+import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox, Entry
-import pandas as pd
+from tkinter import filedialog, messagebox, Entry, ttk
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.widgets import SpanSelector
 from matplotlib.ticker import EngFormatter
-from scipy.signal import welch
-from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from background import LatestOnlyWorker, TaskRunner, TaskCancelled
+from psd_cache import PSDCache, cache_key
+from fingerprint import fingerprint
+from figure_cache import FigureExportCache
+from psd_export import write_psd
+from plot_artists import LinePlotter
+from range_stats import RangeStats, samples_in_span, format_summary
+from lod import LODLine, MinMaxPyramid
+
+PSD_CHUNK = 1 << 20  # Samples per accumulator update between progress/cancel checks
+
+# pandas and scipy (through these modules) are only needed once a file is
+# opened, so they are imported on first use and warmed up in the background
+# after the window is shown
+PRELOAD_MODULES = ['pandas', 'scipy.signal', 'scipy.fft', 'sidecar', 'welch_stream', 'segment_index']
+
+
+def preload_modules(names):
+    for name in names:
+        try:
+            __import__(name)
+        except ImportError as e:
+            print(f"Could not preload {name}: {e}")
+
 
 class PSDPlotterApp:
     def __init__(self, root):
@@ -19,11 +46,34 @@ class PSDPlotterApp:
 
         self.file_path = None
         self.df = None
+        self.range_stats = None  # (column names, RangeStats) of the loaded file
         self.selected_range = None
         self.sensitivity = 24e3  # Default sensitivity in Hz/V
+        self.last_psd = None  # (f, unscaled Pxx, title, span) of the PSD on screen
+
+        # PSDs computed in earlier sessions, so reopening a file skips Welch
+        self.psd_cache = PSDCache()
+
+        # Rasterised exports; an unchanged figure is not rendered again
+        self.export_cache = FigureExportCache()
+        # (signal, time axis, sorted flag) snapshot handed to live previews, and
+        # the preview worker's own (signal, SegmentIndex) built from it
+        self.span_source = None
+        self.span_index = None
+        # Min/max envelope of the signal; the axes only holds it weakly
+        self.signal_line = None
+
+        # Live span previews are computed off the Tk thread, newest request wins
+        self.preview_worker = LatestOnlyWorker(self.root)
+
+        # Loading, PSD computation and export run here so the window never freezes
+        self.tasks = TaskRunner(self.root)
 
         self.create_widgets()
 
+        # Warm up the heavy imports once the window is on screen
+        self.root.after_idle(lambda: threading.Thread(target=preload_modules, args=(PRELOAD_MODULES,), daemon=True).start())
+
     def create_widgets(self):
         # File Selection Button
         self.select_file_button = tk.Button(self.root, text="Select CSV File", command=self.load_file, bg="#87ceeb")
@@ -39,6 +89,17 @@ class PSDPlotterApp:
         self.sensitivity_entry = Entry(self.root)
         self.sensitivity_entry.insert(0, str(self.sensitivity))
         self.sensitivity_entry.pack()
+        self.sensitivity_entry.bind("<Return>", self.apply_sensitivity)
+
+        # Streaming mode computes the PSD chunk by chunk without loading the file
+        self.streaming_var = tk.IntVar()
+        self.streaming_checkbox = tk.Checkbutton(self.root, text="Streaming Mode (large files)", variable=self.streaming_var, bg="#f0f8ff")
+        self.streaming_checkbox.pack()
+
+        # Live preview recomputes the PSD while the span is being dragged
+        self.live_var = tk.IntVar()
+        self.live_checkbox = tk.Checkbutton(self.root, text="Live PSD Preview", variable=self.live_var, bg="#f0f8ff")
+        self.live_checkbox.pack()
 
         # Plot Button
         self.plot_button = tk.Button(self.root, text="Plot PSD", command=self.plot_psd, bg="#87ceeb")
@@ -48,22 +109,126 @@ class PSDPlotterApp:
         self.export_button = tk.Button(self.root, text="Export Plot", command=self.export_plot, bg="#87ceeb")
         self.export_button.pack(pady=10)
 
-        # Matplotlib Figure
-        self.fig, self.ax = plt.subplots(figsize=(6, 4))
+        # Export PSD Data Button
+        self.export_data_button = tk.Button(self.root, text="Export PSD Data", command=self.export_psd_data, bg="#87ceeb")
+        self.export_data_button.pack(pady=10)
+
+        # Progress of the running background task
+        self.progress_frame = tk.Frame(self.root, bg="#f0f8ff")
+        self.progress_frame.pack(pady=5)
+        self.status_label = tk.Label(self.progress_frame, text="Ready", bg="#f0f8ff", width=24, anchor="w")
+        self.status_label.pack(side=tk.LEFT)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, length=200, mode="determinate", maximum=1.0)
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(self.progress_frame, text="Cancel", command=self.tasks.cancel, state="disabled", bg="#87ceeb")
+        self.cancel_button.pack(side=tk.LEFT)
+
+        # Matplotlib Figure: signal on top, PSD below. A plain Figure rather than
+        # pyplot, so it can be pickled and rendered off the Tk thread on export.
+        self.fig = Figure(figsize=(6, 7))
+        self.ax_glevels, self.ax = self.fig.subplots(2, 1)
+        self.fig.subplots_adjust(hspace=0.5)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.root)
         self.canvas.get_tk_widget().pack()
 
-        # Span Selector
-        self.span_selector = SpanSelector(self.ax, self.onselect, 'horizontal', useblit=True)
+        # The PSD axes is set up once; updates only move its line
+        self.ax.set_yscale('log')
+        self.ax.set_xlabel('Frequency [Hz]')
+        self.ax.set_ylabel('Power/Frequency [dB/Hz]')
+        self.ax.set_title('Power Spectral Density')
+
+        # Set the formatter for the y-axis to display engineering notation
+        self.ax.yaxis.set_major_formatter(EngFormatter(unit='dB'))
+        self.plotter = LinePlotter(self.canvas)
+
+        # Span Selector over the signal
+        self.span_selector = SpanSelector(self.ax_glevels, self.onselect, 'horizontal', useblit=True,
+                                          onmove_callback=self.on_span_move)
+
+    def run_task(self, label, fn, args, on_done):
+        if self.tasks.busy:
+            tk.messagebox.showwarning("Busy", "Please wait for the current task to finish or cancel it.")
+            return
+        for button in (self.select_file_button, self.plot_button, self.export_button, self.export_data_button):
+            button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.status_label.config(text=f"{label}...")
+        self.progress_bar["value"] = 0
+        self.tasks.start(fn, args, on_done=lambda result: self.task_finished(on_done, result),
+                         on_progress=self.task_progress, on_error=self.task_failed)
+
+    def task_progress(self, fraction, message=None):
+        self.progress_bar["value"] = fraction
+
+    def task_finished(self, on_done, result):
+        self.reset_task_widgets("Ready")
+        on_done(result)
+
+    def task_failed(self, error):
+        if isinstance(error, TaskCancelled):
+            self.reset_task_widgets("Cancelled")
+        else:
+            self.reset_task_widgets("Failed")
+            tk.messagebox.showerror("Error", str(error))
+
+    def reset_task_widgets(self, status):
+        for button in (self.select_file_button, self.plot_button, self.export_button, self.export_data_button):
+            button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text=status)
+        self.progress_bar["value"] = 0
 
     def load_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
 
         if file_path:
-            self.file_path = file_path
-            self.df = pd.read_csv(file_path)
-            self.file_info_label.config(text=f"Selected File: {file_path}")
-            tk.messagebox.showinfo("File Loaded", "CSV file loaded successfully.")
+            if self.streaming_var.get():
+                self.file_loaded(file_path, None)
+            else:
+                self.run_task("Loading", self.read_file, (file_path,),
+                              lambda result: self.file_loaded(file_path, *result))
+
+    def read_file(self, task, file_path):
+        # Runs on the task thread
+        from sidecar import read_csv_cached, TextColumnsError
+        # Fingerprint here so psd_key() on the Tk thread is a memo lookup
+        fingerprint(file_path)
+        try:
+            df = read_csv_cached(file_path, progress=task.progress)
+        except TextColumnsError as e:
+            # No sidecar for text columns; keep the frame the loader already parsed
+            df = e.data
+        # The signal's envelope pyramid is built here too, off the Tk thread
+        return df, self.build_range_stats(df), MinMaxPyramid(df.iloc[:, 1].to_numpy())
+
+    def build_range_stats(self, df):
+        # Prefix sums and extrema of every numeric column, built once per file
+        # so a selection's statistics never touch the samples it covers
+        if df is None:
+            return None
+        values = df.iloc[:, 1:].select_dtypes('number')
+        if values.shape[1] == 0:
+            return None
+        return [str(c) for c in values.columns], RangeStats(values.to_numpy(dtype=np.float64))
+
+    def file_loaded(self, file_path, df, range_stats=None, pyramid=None):
+        # A preview of the previous file must not land on this one
+        self.preview_worker.cancel()
+        self.file_path = file_path
+        self.df = df
+        self.range_stats = range_stats
+        self.span_source = None
+        if df is not None:
+            self.plot_signal(pyramid)
+        self.file_info_label.config(text=f"Selected File: {file_path}")
+
+        # Show the PSD from an earlier session straight away, if there is one
+        key = self.psd_key(1.0)
+        cached = self.psd_cache.get(key) if key else None
+        if cached is not None:
+            self.show_psd(cached['f'], cached['Pxx'], 'Power Spectral Density')
+
+        tk.messagebox.showinfo("File Loaded", "CSV file loaded successfully.")
 
     def plot_psd(self):
         sensitivity_str = self.sensitivity_entry.get()
@@ -73,66 +238,198 @@ class PSDPlotterApp:
             tk.messagebox.showerror("Error", "Please enter a valid numeric value for sensitivity.")
             return
 
-        if self.df is None:
+        fs = 1.0  # Adjust this value based on your data
+
+        if self.streaming_var.get() and self.file_path:
+            job, args = self.calculate_psd_streaming, (self.file_path, fs)
+        elif self.df is None:
             tk.messagebox.showerror("Error", "Please select a CSV file first.")
             return
+        else:
+            data = self.df.iloc[:, 1].to_numpy()  # Assuming the data is in the second column, change as needed
 
-        data = self.df.iloc[:, 1]  # Assuming the data is in the second column, change as needed
-        fs = 1.0  # Adjust this value based on your data
+            n = len(data)
+            job, args = self.calculate_psd_task, (data, fs, n)
 
-        n = len(data)
-        f, Pxx = self.calculate_psd(data, fs, n)
+        self.run_task("Computing PSD", self.cached_psd, (self.psd_key(fs), job, args),
+                      lambda result: self.show_psd(*result, 'Power Spectral Density'))
 
-        self.ax.clear()
-        self.ax.semilogy(f, Pxx)
-        self.ax.set_xlabel('Frequency [Hz]')
-        self.ax.set_ylabel('Power/Frequency [dB/Hz]')
-        self.ax.set_title('Power Spectral Density')
+    def psd_key(self, fs):
+        # Same content (wherever the file lives now): same PSD. None when the file is gone.
+        try:
+            source = (fingerprint(self.file_path), np.dtype(np.float64).str)
+        except (OSError, TypeError):
+            return None
+        return cache_key(source, columns=(1,), welch=(fs, 'hann', 1024, None, None), ranges=None)
 
-        # Set the formatter for the y-axis to display engineering notation
-        self.ax.yaxis.set_major_formatter(EngFormatter(unit='dB'))
+    def cached_psd(self, task, key, job, args):
+        # Runs on the task thread
+        if key is not None:
+            cached = self.psd_cache.get(key)
+            if cached is not None:
+                return cached['f'], cached['Pxx']
+        f, Pxx = job(task, *args)
+        if key is not None:
+            self.psd_cache.put(key, f=f, Pxx=Pxx)
+        return f, Pxx
+
+    def show_psd(self, f, Pxx, title, span=None):
+        # Pxx is unscaled; the sensitivity is only applied to the plotted bins
+        self.last_psd = (f, Pxx, title, span)
+        if self.ax.get_title() != title:
+            self.ax.set_title(title)
+            self.plotter.invalidate()
+        self.plotter.update(self.ax, 'psd', f, self.to_db(Pxx))
+        self.plotter.flush()
+
+    def apply_sensitivity(self, event=None):
+        # Re-scale the PSD on screen without recomputing it
+        try:
+            self.sensitivity = float(self.sensitivity_entry.get())
+        except ValueError:
+            return
+        if self.last_psd is not None:
+            self.show_psd(*self.last_psd)
+
+    def calculate_psd(self, data, fs, n, task=None):
+        # Welch in chunks, so a background task can report progress and be cancelled
+        from welch_stream import WelchAccumulator
+        acc = WelchAccumulator(fs=fs, nperseg=1024)
+        for start in range(0, n, PSD_CHUNK):
+            acc.update(data[start:start + PSD_CHUNK])
+            if task is not None:
+                task.progress(min(start + PSD_CHUNK, n) / n)
+        return acc.finalize()
+
+    def calculate_psd_task(self, task, data, fs, n):
+        return self.calculate_psd(data, fs, n, task=task)
 
+    def calculate_psd_streaming(self, task, file_path, fs):
+        # Same estimate as calculate_psd, read from disk in chunks
+        from welch_stream import streaming_welch
+        return streaming_welch(file_path, 1, fs=fs, nperseg=1024, progress=task.progress)
+
+    def to_db(self, Pxx):
+        return 10 * np.log10(Pxx / (self.sensitivity**2))  # Convert to dB re: (Hz/V)^2
+
+    def plot_signal(self, pyramid=None):
+        # Drawn as a min/max envelope that re-decimates on zoom, never every sample.
+        # A time column that is not numeric and sorted (e.g. timestamp strings)
+        # falls back to the sample index.
+        time_col = self.df.iloc[:, 0]
+        use_time = time_col.dtype.kind in 'biuf' and bool(np.all(np.diff(time_col.to_numpy()) >= 0))
+        self.time_col = time_col.to_numpy() if use_time else np.arange(len(time_col))
+        self.time_sorted = True
+        self.span_source = (self.df.iloc[:, 1].to_numpy(), self.time_col, self.time_sorted)
+
+        if self.signal_line is not None:
+            self.signal_line.remove()
+        self.ax_glevels.clear()
+        signal = pyramid if pyramid is not None else self.df.iloc[:, 1].to_numpy()
+        self.signal_line = LODLine(self.ax_glevels, signal, x=self.time_col if use_time else None)
+        self.ax_glevels.set_xlabel('Time' if use_time else 'Sample')
+        self.ax_glevels.set_ylabel('Signal')
+        self.ax_glevels.set_title('Drag to Select a Range')
         self.canvas.draw()
 
-    def calculate_psd(self, data, fs, n):
-        f, Pxx = welch(data, fs, nperseg=1024)
-        Pxx = 10 * np.log10(Pxx / (self.sensitivity**2))  # Convert to dB re: (Hz/V)^2
-        return f, Pxx
+    def compute_span_psd(self, source, xmin, xmax):
+        # Runs on the preview worker thread, on the snapshot taken at submit time;
+        # span_index is only ever touched from this thread
+        from segment_index import SegmentIndex
+        signal, time_col, time_sorted = source
+        if self.span_index is None or self.span_index[0] is not signal:
+            self.span_index = (signal, SegmentIndex(signal, fs=1.0, nperseg=1024))
+        start, stop = samples_in_span(time_col, xmin, xmax, time_sorted)
+        if stop - start < 2:
+            return None
+        f, Pxx = self.span_index[1].query(start, stop)
+        return f, Pxx, (xmin, xmax)
+
+    def preview_span(self, xmin, xmax):
+        if self.span_source is not None and xmax > xmin:
+            self.preview_worker.submit(self.compute_span_psd, self.update_psd_preview, self.span_source, xmin, xmax)
+
+    def on_span_move(self, xmin, xmax):
+        if self.live_var.get():
+            self.preview_span(xmin, xmax)
+
+    def update_psd_preview(self, result):
+        if result is None:
+            return
+        f, Pxx, span = result
+        self.show_psd(f, Pxx, 'Power Spectral Density (Selected Range)', span)
 
     def onselect(self, xmin, xmax):
         self.selected_range = (xmin, xmax)
+        if self.live_var.get():
+            self.preview_span(xmin, xmax)
+            return
         if self.selected_range:
-            selected_data = self.get_data_within_range(self.selected_range)
-            self.analyze_selected_data(selected_data)
+            self.analyze_selected_range(*self.selected_range)
 
-    def get_data_within_range(self, selected_range):
-        if self.df is not None:
-            frequency_column = self.df.columns[0]
-            data_column = self.df.columns[1]
-
-            selected_data = self.df[(self.df[frequency_column] >= selected_range[0]) &
-                                     (self.df[frequency_column] <= selected_range[1])]
-            return selected_data
-        else:
+    def range_summary(self, xmin, xmax):
+        # Statistics of the selection in g (signal / sensitivity), or None
+        if self.df is None or self.range_stats is None:
             return None
+        names, stats = self.range_stats
+        summary = stats.query(*samples_in_span(self.time_col, xmin, xmax, self.time_sorted),
+                              scale=1.0 / self.sensitivity)
+        return None if summary is None else format_summary(summary, names, rms_label='GRMS')
 
-    def analyze_selected_data(self, selected_data):
-        if selected_data is not None:
-            # Perform further analysis on the selected data
-            messagebox.showinfo("Selected Range", f"Selected range: {self.selected_range}\n\n"
-                                                   f"Data within the selected range:\n{selected_data}")
+    def analyze_selected_range(self, xmin, xmax):
+        summary = self.range_summary(xmin, xmax)
+        if summary is not None:
+            messagebox.showinfo("Selected Range", f"Selected range: {self.selected_range}\n\n{summary}")
         else:
             messagebox.showwarning("No Data", "No data available within the selected range.")
 
+    def export_psd_data(self):
+        if self.last_psd is None:
+            tk.messagebox.showerror("Error", "Please plot the PSD before exporting.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[
+            ("CSV files", "*.csv"), ("NumPy archives", "*.npz"), ("Parquet files", "*.parquet"),
+            ("HDF5 files", "*.h5 *.hdf5")])
+        if not file_path:
+            return
+        f, Pxx, _, span = self.last_psd
+        metadata = {'fs': 1.0, 'nperseg': 1024, 'noverlap': 512, 'nfft': 1024, 'window': 'hann',
+                    'sensitivity': self.sensitivity, 'range': span, 'source': self.file_path,
+                    'units': '(signal / sensitivity)^2 / Hz'}
+        self.run_task("Exporting", self.write_psd_data, (file_path, f, Pxx / self.sensitivity ** 2, metadata),
+                      lambda _: tk.messagebox.showinfo("Export Successful", "PSD data exported successfully."))
+
+    def write_psd_data(self, task, file_path, f, Pxx, metadata):
+        # Runs on the task thread
+        return write_psd(file_path, f, Pxx, names=['PSD'], metadata=metadata)
+
     def export_plot(self):
         if self.fig:
             file_path = filedialog.asksaveasfilename(defaultextension=".jpeg", filetypes=[("JPEG files", "*.jpeg")])
             if file_path:
-                self.fig.savefig(file_path, format='jpeg', dpi=300)
-                tk.messagebox.showinfo("Export Successful", "Plot exported successfully.")
+                # Snapshot the figure here; the slow 300 dpi render happens on the task thread.
+                # The signal is an LODLine envelope (about two points per pixel column), so
+                # the snapshot stays small however long the recording is.
+                figure_state = pickle.dumps(self.fig)
+                self.run_task("Exporting", self.render_export, (figure_state, file_path),
+                              lambda _: tk.messagebox.showinfo("Export Successful", "Plot exported successfully."))
         else:
             tk.messagebox.showerror("Error", "Please plot the PSD before exporting.")
 
+    def render_export(self, task, figure_state, file_path):
+        # Runs on the task thread; only axes that changed since the last export are redrawn
+        task.progress(0.1)
+        image = self.export_cache.export(figure_state, 'jpeg', dpi=300)
+        temp_path = file_path + '.part'
+        with open(temp_path, 'wb') as f:
+            f.write(image)
+        try:
+            task.progress(1.0)
+        except TaskCancelled:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, file_path)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = PSDPlotterApp(root)
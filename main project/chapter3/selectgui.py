@@ -1,3 +1,5 @@
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import pandas as pd
@@ -6,6 +8,10 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.widgets import SpanSelector
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from psd_engine import periodogram
+from range_stats import RangeStats, samples_in_span, format_summary
+
 class PSDPlotterApp:
     def __init__(self, root):
         self.root = root
@@ -14,6 +20,7 @@ class PSDPlotterApp:
         self.file_path = None
         self.df = None
         self.selected_range = None
+        self.range_stats = None
 
         self.create_widgets()
 
@@ -44,6 +51,7 @@ class PSDPlotterApp:
         if file_path:
             self.file_path = file_path
             self.df = pd.read_csv(file_path)
+            self.build_range_stats()
             self.file_info_label.config(text=f"Selected File: {file_path}")
             tk.messagebox.showinfo("File Loaded", "CSV file loaded successfully.")
 
@@ -67,33 +75,37 @@ class PSDPlotterApp:
         self.canvas.draw()
 
     def calculate_psd(self, data, fs, n):
-        fft_result = np.fft.fft(data)
-        freq = np.fft.fftfreq(n, d=1/fs)
-        Pxx = np.abs(fft_result)**2 / (fs * n)
-        return freq[:n//2], Pxx[:n//2]
+        # One-sided rfft periodogram; only the non-negative bins are computed
+        return periodogram(np.asarray(data)[:n], fs)
+
+    def build_range_stats(self):
+        # Prefix sums and extrema of every numeric column, so any selection is summarised in constant time
+        # A non-numeric first column (e.g. timestamp strings) falls back to the row index
+        x_column = self.df.iloc[:, 0]
+        self.x_column = x_column.to_numpy() if x_column.dtype.kind in 'biuf' else np.arange(len(x_column))
+        self.x_sorted = bool(np.all(np.diff(self.x_column) >= 0))
+        values = self.df.iloc[:, 1:].select_dtypes('number')
+        self.stats_columns = [str(c) for c in values.columns]
+        self.range_stats = RangeStats(values.to_numpy(dtype=np.float64)) if self.stats_columns else None
 
     def onselect(self, xmin, xmax):
         self.selected_range = (xmin, xmax)
         if self.selected_range:
-            selected_data = self.get_data_within_range(self.selected_range)
-            self.analyze_selected_data(selected_data)
+            samples = self.get_samples_within_range(self.selected_range)
+            self.analyze_selected_range(samples)
 
-    def get_data_within_range(self, selected_range):
+    def get_samples_within_range(self, selected_range):
+        # [start, stop) of the rows whose first-column value lies in the range
         if self.df is not None:
-            frequency_column = self.df.columns[0]
-            data_column = self.df.columns[1]
-
-            selected_data = self.df[(self.df[frequency_column] >= selected_range[0]) &
-                                     (self.df[frequency_column] <= selected_range[1])]
-            return selected_data
+            return samples_in_span(self.x_column, selected_range[0], selected_range[1], self.x_sorted)
         else:
             return None
 
-    def analyze_selected_data(self, selected_data):
-        if selected_data is not None:
-            # Perform further analysis on the selected data
+    def analyze_selected_range(self, samples):
+        summary = self.range_stats.query(*samples) if samples is not None and self.range_stats else None
+        if summary is not None:
             messagebox.showinfo("Selected Range", f"Selected range: {self.selected_range}\n\n"
-                                                   f"Data within the selected range:\n{selected_data}")
+                                                   f"{format_summary(summary, self.stats_columns)}")
         else:
             messagebox.showwarning("No Data", "No data available within the selected range.")
 
@@ -1,3 +1,5 @@
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import pandas as pd
@@ -6,6 +8,9 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.widgets import SpanSelector
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from psd_engine import periodogram
+
 class PSDPlotterApp:
     def __init__(self, root):
         self.root = root
@@ -63,10 +68,8 @@ class PSDPlotterApp:
         self.canvas.draw()
 
     def calculate_psd(self, data, fs, n):
-        fft_result = np.fft.fft(data)
-        freq = np.fft.fftfreq(n, d=1/fs)
-        Pxx = np.abs(fft_result)**2 / (fs * n)
-        return freq[:n//2], Pxx[:n//2]
+        # One-sided rfft periodogram; only the non-negative bins are computed
+        return periodogram(np.asarray(data)[:n], fs)
 
     def onselect(self, xmin, xmax):
         self.selected_range = (xmin, xmax)
@@ -0,0 +1,67 @@
+import itertools
+
+
+class RecomputeGraph:
+    # Memoised processing stages. A stage is fn(get) -> value, where get(name)
+    # returns a parameter or another stage's value and records it as an input.
+    # A stage reruns only when one of the inputs it read last time has changed,
+    # so e.g. a new window recomputes from Welch on while a new sensitivity
+    # only redoes the scaling. Inputs read conditionally are tracked too.
+    def __init__(self):
+        self._params = {}
+        self._stages = {}
+        self._cache = {}
+        self._versions = itertools.count(1)
+
+    def stage(self, name, fn):
+        self._stages[name] = fn
+        self._cache.pop(name, None)
+
+    def set(self, **params):
+        # A parameter only counts as changed when its value differs
+        for name, value in params.items():
+            entry = self._params.get(name)
+            if entry is None or not _same(entry[0], value):
+                self._params[name] = (value, next(self._versions))
+
+    def get(self, name):
+        return self.resolve(name)[0]
+
+    def resolve(self, name):
+        # (value, version); the version changes whenever the value is recomputed
+        if name in self._params:
+            return self._params[name]
+        if name not in self._stages:
+            raise KeyError(f"Unknown parameter or stage: {name}")
+
+        cached = self._cache.get(name)
+        if cached is not None:
+            value, version, inputs = cached
+            if all(self.resolve(dep)[1] == seen for dep, seen in inputs.items()):
+                return value, version
+
+        inputs = {}
+
+        def get(dep):
+            value, version = self.resolve(dep)
+            inputs[dep] = version
+            return value
+
+        value = self._stages[name](get)
+        version = next(self._versions)
+        self._cache[name] = (value, version, inputs)
+        return value, version
+
+    def invalidate(self, name=None):
+        # Drop one cached stage (or all of them); stages that read it rerun too
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+
+def _same(a, b):
+    try:
+        return type(a) is type(b) and bool(a == b)
+    except (TypeError, ValueError):
+        return a is b
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class LinePlotter:
+    # Keeps one Line2D per key and updates it in place with set_data. Axes
+    # whose limits still fit the new data are repainted on their own with
+    # blitting in flush(); a new line or a limit change costs a full redraw.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.lines = {}
+        self.dirty = []
+        self.needs_draw = False
+
+    def update(self, ax, key, x, y, plot='plot', **plot_kwargs):
+        # Returns True when the line had to be created
+        line = self.lines.get(key)
+        if line is None or line.axes is not ax:
+            line, = getattr(ax, plot)(x, y, **plot_kwargs)
+            self.lines[key] = line
+            self.needs_draw = True
+            return True
+
+        line.set_data(x, y)
+        if self.fits_view(ax, x, y):
+            if ax not in self.dirty:
+                self.dirty.append(ax)
+        else:
+            ax.relim()
+            ax.autoscale_view()
+            self.needs_draw = True
+        return False
+
+    def fits_view(self, ax, x, y):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        ok = np.isfinite(y)
+        if ax.get_yscale() == 'log':
+            ok &= y > 0
+        if not ok.any():
+            return True
+        xmin, xmax = ax.get_xlim()
+        ymin, ymax = ax.get_ylim()
+        return xmin <= x[0] and x[-1] <= xmax and ymin <= y[ok].min() and y[ok].max() <= ymax
+
+    def remove(self, key):
+        line = self.lines.pop(key, None)
+        if line is not None and line.axes is not None:
+            line.remove()
+            self.needs_draw = True
+
+    def invalidate(self):
+        # Something outside the axes frames changed (titles, labels)
+        self.needs_draw = True
+
+    def flush(self):
+        if self.needs_draw:
+            self.canvas.draw_idle()
+        else:
+            for ax in self.dirty:
+                ax.redraw_in_frame()
+                self.canvas.blit(ax.bbox)
+        self.dirty = []
+        self.needs_draw = False
@@ -1,3 +1,5 @@
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, Entry, StringVar, OptionMenu
 import pandas as pd
@@ -7,10 +9,10 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.widgets import SpanSelector
 from matplotlib.ticker import EngFormatter
 from scipy.signal import welch
-from PIL import Image
-from docx import Document
-from docx.shared import Inches
-from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from report_export import export_docx
+from figure_cache import FigureExportCache
 
 class PSDPlotterApp:
     def __init__(self, root):
@@ -30,6 +32,9 @@ class PSDPlotterApp:
         self.span_selector = None
         self.g_levels_data = None
 
+        # Repeated exports reuse the rendered images of unchanged figures
+        self.export_cache = FigureExportCache()
+
         self.create_widgets()
 
     def create_widgets(self):
@@ -133,17 +138,19 @@ class PSDPlotterApp:
 
         self.canvas.draw()
 
-        # Save g-levels for later use
-        self.g_levels_data = pd.DataFrame({'Time': self.df.iloc[:, 0], 'G-Levels': g_levels})
+        # Save the unscaled voltages for later use; the PSD applies the sensitivity to its bins
+        self.g_levels_data = pd.DataFrame({'Time': self.df.iloc[:, 0], 'Voltage': voltage_col}, copy=False)
 
         # Span Selector
         self.span_selector = SpanSelector(self.ax, self.onselect, 'horizontal', useblit=True)
     
 
-    def calculate_psd(self, data, fs, n, nperseg=None, noverlap=None, nfft=None, window_type='hann'):
+    def calculate_psd(self, data, fs, n, nperseg=None, noverlap=None, nfft=None, window_type='hann', sensitivity=1.0):
         f, Pxx = welch(data, fs, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window=window_type)
 
-        Pxx = 10 * np.log10(np.maximum(Pxx, np.finfo(float).tiny))  # Assuming sensitivity is not provided
+        Pxx = 10 * np.log10(np.maximum(Pxx, np.finfo(float).tiny))
+        # PSD of voltage / sensitivity is PSD / sensitivity**2: apply it to the bins, not the signal
+        Pxx -= 20 * np.log10(sensitivity)
 
         return f, Pxx
 
@@ -158,9 +165,6 @@ class PSDPlotterApp:
         # Sensitivity factor in Hz/V (replace with the actual sensitivity value)
         sensitivity = float(self.sensitivity_entry.get())
 
-        # Convert voltage to g-levels
-        g_levels = voltage_col / sensitivity
-
         if start_index is not None and end_index is not None:
             # Select data within the specified span
             selected_data = self.g_levels_data[(self.g_levels_data['Time'] >= start_index) &
@@ -172,7 +176,7 @@ class PSDPlotterApp:
 
             # Plot PSD for the selected span
             fs = 1.0  # Adjust this value based on your data
-            n = len(selected_data['G-Levels'])
+            n = len(selected_data['Voltage'])
 
             # Get additional parameters for welch function
             try:
@@ -185,11 +189,11 @@ class PSDPlotterApp:
 
             window_type = self.window_type_var.get()
 
-            f, Pxx = self.calculate_psd(selected_data['G-Levels'], fs, n, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window_type=window_type)
+            f, Pxx = self.calculate_psd(selected_data['Voltage'], fs, n, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window_type=window_type, sensitivity=sensitivity)
         else:
             # Plot PSD for the entire data
             fs = 1.0  # Adjust this value based on your data
-            n = len(g_levels)
+            n = len(voltage_col)
 
             # Get additional parameters for welch function
             try:
@@ -202,7 +206,7 @@ class PSDPlotterApp:
 
             window_type = self.window_type_var.get()
 
-            f, Pxx = self.calculate_psd(g_levels, fs, n, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window_type=window_type)
+            f, Pxx = self.calculate_psd(voltage_col, fs, n, nperseg=nperseg, noverlap=noverlap, nfft=nfft, window_type=window_type, sensitivity=sensitivity)
 
     
 
@@ -223,33 +227,14 @@ class PSDPlotterApp:
             self.plot_psd(xmin, xmax)
 
     def export_to_docx(self):
-        if self.fig:
+        if self.ax_psd.has_data():
             file_path = filedialog.asksaveasfilename(defaultextension=".docx", filetypes=[("Word Document", "*.docx")])
             if file_path:
-                document = Document()
-                document.add_heading('PSD Plot and G-Levels Plot', 0)
-
-                # Export G-Levels plot
-                g_levels_img_data = BytesIO()
-                self.fig.savefig(g_levels_img_data, format='png', dpi=300)
-                g_levels_img = Image.open(g_levels_img_data)
-                g_levels_img_data.close()
-                g_levels_img_path = file_path.replace('.docx', '_g_levels_plot.png')
-                g_levels_img.save(g_levels_img_path)
-                document.add_heading('G-Levels Plot', level=1)
-                document.add_picture(g_levels_img_path, width=Inches(5))
-
-                # Export PSD plot
-                psd_img_data = BytesIO()
-                self.fig.savefig(psd_img_data, format='png', dpi=300)
-                psd_img = Image.open(psd_img_data)
-                psd_img_data.close()
-                psd_img_path = file_path.replace('.docx', '_psd_plot.png')
-                psd_img.save(psd_img_path)
-                document.add_heading('PSD Plot (Selected Span)', level=1)
-                document.add_picture(psd_img_path, width=Inches(5))
-
-                document.save(file_path)
+                # Each figure is rendered once at dpi=300 and the PNG bytes go
+                # straight into the document, with no image files on disk
+                export_docx(file_path, [('G-Levels Plot', self.fig_g_levels),
+                                        ('PSD Plot (Selected Span)', self.fig_psd)],
+                            title='PSD Plot and G-Levels Plot', cache=self.export_cache)
 
                 tk.messagebox.showinfo("Export Successful", "Plots exported successfully.")
         else:
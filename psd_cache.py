@@ -0,0 +1,98 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+# Computed PSDs kept across sessions, one .npz per key. A hit touches the
+# file's mtime, so eviction (oldest mtime first) is least-recently-used.
+CACHE_EXT = '.npz'
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'psd_plotter')
+
+
+def cache_key(source, **params):
+    # source identifies the recording (see dataset_key); params are everything
+    # else the result depends on: column, range, fs, nperseg, noverlap, nfft, window
+    parts = (source, sorted(params.items()))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class PSDCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXT)
+
+    def get(self, key):
+        # dict of the stored arrays, or None on a miss
+        path = self.path(key)
+        try:
+            with np.load(path) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        path = self.path(key)
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a half-written
+            # entry; each writer gets its own, as worker processes may put the same key
+            fd, tmp_path = tempfile.mkstemp(prefix=key, suffix='.tmp', dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError as e:
+            print(f"Could not write PSD cache entry {path}: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_EXT):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_EXT):
+                os.remove(os.path.join(self.directory, name))
+
+
+def pack_spectra(spectra):
+    # [(f, Pxx), ...] -> arrays for PSDCache.put; lengths may differ per entry
+    arrays = {}
+    for i, (f, Pxx) in enumerate(spectra):
+        arrays[f'f{i}'] = f
+        arrays[f'Pxx{i}'] = Pxx
+    return arrays
+
+
+def unpack_spectra(arrays):
+    return [(arrays[f'f{i}'], arrays[f'Pxx{i}']) for i in range(len(arrays) // 2)]
@@ -0,0 +1,39 @@
+import numpy as np
+import scipy.fft
+from welch_stream import WelchAccumulator, resolve_workers
+
+
+def welch_channels(x, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None, detrend='constant', axis=0,
+                   workers=None, dtype=np.float64):
+    # PSD of every channel of a 2-D array in a single vectorised pass.
+    # With axis=0 the input is (samples x channels) and Pxx is (freqs x channels);
+    # with axis=-1 it is (channels x samples) and Pxx is (channels x freqs).
+    # The window and FFT setup come from the shared plan cache; workers > 1
+    # (or -1 for every core) spreads the segments over a thread pool.
+    x = np.moveaxis(np.asarray(x), axis, 0)
+    acc = WelchAccumulator(fs=fs, window=window, nperseg=nperseg, noverlap=noverlap, nfft=nfft, detrend=detrend,
+                           workers=workers, dtype=dtype)
+    f, Pxx = acc.update(x).finalize()
+    return f, np.moveaxis(Pxx, 0, axis)
+
+
+def periodogram(x, fs=1.0, dtype=None, workers=None):
+    # One-sided periodogram of a whole record from rfft: only the n // 2 + 1
+    # non-negative bins are ever computed. Every bin except DC (and Nyquist
+    # for even n) is doubled so the PSD integrates to the signal's mean square.
+    # float32 input stays float32 throughout unless dtype says otherwise; the
+    # frequencies are always float64, as float32 cannot tell neighbouring bins
+    # of a long record apart.
+    x = np.asarray(x)
+    if dtype is None:
+        dtype = x.dtype if x.dtype in (np.float32, np.float64) else np.float64
+    x = x.astype(dtype, copy=False)
+    n = len(x)
+
+    spectrum = scipy.fft.rfft(x, workers=resolve_workers(workers))
+    Pxx = np.square(spectrum.real)
+    Pxx += np.square(spectrum.imag)
+    del spectrum
+    Pxx *= 1.0 / (fs * n)
+    Pxx[1:None if n % 2 else -1] *= 2
+    return scipy.fft.rfftfreq(n, 1 / fs), Pxx
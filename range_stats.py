@@ -0,0 +1,104 @@
+from collections import namedtuple
+import numpy as np
+
+# Summary statistics of any sample range in constant time. Built once per
+# recording: prefix sums of x and x**2 (taken about each channel's mean, so
+# long records keep their precision) give count, mean and RMS from two
+# subtractions; a sparse table of per-block minima/maxima gives the extrema,
+# with at most two partial blocks scanned directly at the range edges.
+STATS_BLOCK = 64
+
+RangeSummary = namedtuple('RangeSummary', 'count mean rms min max peak crest_factor')
+
+
+class RangeStats:
+    def __init__(self, x, block=STATS_BLOCK):
+        # x is (samples,) or (samples, channels)
+        x = np.asarray(x, dtype=np.float64)
+        self.squeeze = x.ndim == 1
+        self.x = x[:, None] if self.squeeze else x
+        self.block = block
+        n, n_channels = self.x.shape
+
+        self.offset = self.x.mean(axis=0) if n else np.zeros(n_channels)
+        centred = self.x - self.offset
+        self.sum = np.zeros((n + 1, n_channels))
+        np.cumsum(centred, axis=0, out=self.sum[1:])
+        np.square(centred, out=centred)
+        self.sumsq = np.zeros((n + 1, n_channels))
+        np.cumsum(centred, axis=0, out=self.sumsq[1:])
+        del centred
+
+        # Level k holds the extrema of 2**k consecutive blocks starting at each block
+        n_blocks = n // block
+        blocks = self.x[:n_blocks * block].reshape(n_blocks, block, n_channels)
+        self.mins = [blocks.min(axis=1)]
+        self.maxs = [blocks.max(axis=1)]
+        width = 1
+        while 2 * width <= n_blocks:
+            self.mins.append(np.minimum(self.mins[-1][:-width], self.mins[-1][width:]))
+            self.maxs.append(np.maximum(self.maxs[-1][:-width], self.maxs[-1][width:]))
+            width *= 2
+
+    def __len__(self):
+        return len(self.x)
+
+    def query(self, start, stop, scale=1.0):
+        # Statistics of samples [start, stop), multiplied by scale (e.g.
+        # 1 / sensitivity for g and GRMS); None for an empty range
+        start, stop = max(0, int(start)), min(len(self.x), int(stop))
+        count = stop - start
+        if count <= 0:
+            return None
+
+        mean_c = (self.sum[stop] - self.sum[start]) / count
+        mean_sq = (self.sumsq[stop] - self.sumsq[start]) / count + self.offset * (2 * mean_c + self.offset)
+        mean = mean_c + self.offset
+        rms = np.sqrt(np.maximum(mean_sq, 0.0))
+        lo, hi = self.extrema(start, stop)
+
+        mean, rms, lo, hi = mean * scale, rms * abs(scale), lo * scale, hi * scale
+        if scale < 0:
+            lo, hi = hi, lo
+        peak = np.maximum(np.abs(lo), np.abs(hi))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crest = peak / rms
+        if self.squeeze:
+            mean, rms, lo, hi, peak, crest = (v[0] for v in (mean, rms, lo, hi, peak, crest))
+        return RangeSummary(count, mean, rms, lo, hi, peak, crest)
+
+    def extrema(self, start, stop):
+        block = self.block
+        first, last = -(-start // block), stop // block
+        if first >= last:
+            segment = self.x[start:stop]
+            return segment.min(axis=0), segment.max(axis=0)
+
+        level = (last - first).bit_length() - 1
+        width = 1 << level
+        lo = np.minimum(self.mins[level][first], self.mins[level][last - width])
+        hi = np.maximum(self.maxs[level][first], self.maxs[level][last - width])
+        for segment in (self.x[start:first * block], self.x[last * block:stop]):
+            if len(segment):
+                lo = np.minimum(lo, segment.min(axis=0))
+                hi = np.maximum(hi, segment.max(axis=0))
+        return lo, hi
+
+
+def samples_in_span(t, xmin, xmax, is_sorted=True):
+    # [start, stop) of the samples whose time (or x) value lies in [xmin, xmax]
+    t = np.asarray(t)
+    if is_sorted:
+        return int(np.searchsorted(t, xmin)), int(np.searchsorted(t, xmax, side='right'))
+    inside = np.flatnonzero((t >= xmin) & (t <= xmax))
+    return (int(inside[0]), int(inside[-1]) + 1) if len(inside) else (0, 0)
+
+
+def format_summary(summary, names, rms_label='RMS'):
+    # One line per channel, for a message box
+    lines = [f"Samples: {summary.count}"]
+    columns = zip(names, *(np.atleast_1d(v) for v in summary[1:]))
+    for name, mean, rms, lo, hi, peak, crest in columns:
+        lines.append(f"{name}: mean={mean:.6g}, {rms_label}={rms:.6g}, min={lo:.6g}, max={hi:.6g}, "
+                     f"peak={peak:.6g}, crest factor={crest:.4g}")
+    return '\n'.join(lines)
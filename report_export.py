@@ -0,0 +1,72 @@
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+# Figures for reports are rasterised once, straight into memory, and the
+# encoded bytes go into the document as they are: no temporary image files
+# and no decode/re-encode round trip. Larger reports render their figures in
+# worker processes on the Agg backend.
+EXPORT_DPI = 300
+PARALLEL_MIN_FIGURES = 4  # below this, starting workers costs more than it saves
+
+
+def render_figure(fig, fmt='png', dpi=EXPORT_DPI, cache=None, **savefig_kwargs):
+    # cache: a figure_cache.FigureExportCache, to reuse earlier renders
+    if cache is not None:
+        return cache.export(fig, fmt, dpi, **savefig_kwargs)
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, **savefig_kwargs)
+    return buf.getvalue()
+
+
+def init_agg_worker():
+    # ProcessPoolExecutor initializer: render with Agg, never a GUI backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_pickled(figure_state, fmt, dpi, savefig_kwargs):
+    # Runs in a worker process
+    return render_figure(pickle.loads(figure_state), fmt, dpi, **savefig_kwargs)
+
+
+def render_figures(figures, fmt='png', dpi=EXPORT_DPI, max_workers=None, cache=None, **savefig_kwargs):
+    # Encoded images of figures, in order. figures may hold Figure objects or
+    # pickle.dumps() of them; pickles are what get shipped to the workers.
+    # A cache is only consulted when rendering in this process.
+    figures = list(figures)
+    if len(figures) < PARALLEL_MIN_FIGURES or max_workers == 1 or cache is not None:
+        return [render_figure(pickle.loads(fig) if isinstance(fig, bytes) else fig, fmt, dpi, cache,
+                              **savefig_kwargs)
+                for fig in figures]
+
+    states = [fig if isinstance(fig, bytes) else pickle.dumps(fig) for fig in figures]
+    # spawn, so workers never inherit the GUI process's Tk state
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=init_agg_worker) as pool:
+        return list(pool.map(_render_pickled, states, [fmt] * len(states), [dpi] * len(states),
+                             [savefig_kwargs] * len(states)))
+
+
+def build_docx(sections, title=None, width=5.0):
+    # sections: (heading, encoded image) pairs, one picture per heading.
+    # Returns the python-docx Document; call .save() with a path or stream.
+    from docx import Document
+    from docx.shared import Inches
+
+    document = Document()
+    if title:
+        document.add_heading(title, 0)
+    for heading, image in sections:
+        document.add_heading(heading, level=1)
+        document.add_picture(BytesIO(image), width=Inches(width))
+    return document
+
+
+def export_docx(path, sections, title=None, width=5.0, dpi=EXPORT_DPI, max_workers=None, cache=None):
+    # sections: (heading, figure) pairs; every figure is rendered exactly once
+    headings = [heading for heading, _ in sections]
+    images = render_figures([fig for _, fig in sections], fmt='png', dpi=dpi, max_workers=max_workers,
+                            cache=cache)
+    build_docx(zip(headings, images), title=title, width=width).save(path)
@@ -0,0 +1,64 @@
+import numpy as np
+from scipy.signal import welch
+from welch_stream import WelchAccumulator
+
+# Segments transformed per FFT call while building the index
+SEGMENT_BLOCK = 4096
+
+
+class SegmentIndex:
+    # Periodograms of every segment of a record on the Welch grid (segment k
+    # starts at k * step), stored as prefix sums over the segment axis. The PSD
+    # of any sample range is then one subtraction plus at most two extra
+    # segments at the range's edges. Samples run along axis 0, as in
+    # WelchAccumulator.
+    def __init__(self, x, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None, detrend='constant',
+                 workers=None, dtype=np.float64):
+        self.x = np.asarray(x).astype(dtype, copy=False)
+        self.params = WelchAccumulator(fs=fs, window=window, nperseg=nperseg, noverlap=noverlap,
+                                       nfft=nfft, detrend=detrend, workers=workers, dtype=dtype)
+        step = self.params.step
+        n_samples = len(self.x)
+        n_segments = (n_samples - nperseg) // step + 1 if n_samples >= nperseg else 0
+        n_freqs = self.params.nfft // 2 + 1
+
+        self.prefix = np.zeros((n_segments + 1,) + self.x.shape[1:] + (n_freqs,))
+        for k0 in range(0, n_segments, SEGMENT_BLOCK):
+            k1 = min(k0 + SEGMENT_BLOCK, n_segments)
+            power = self.params.segment_power(self.x[k0 * step:(k1 - 1) * step + nperseg])
+            np.cumsum(power, axis=0, dtype=np.float64, out=self.prefix[k0 + 1:k1 + 1])
+            self.prefix[k0 + 1:k1 + 1] += self.prefix[k0]
+
+    @property
+    def n_segments(self):
+        return len(self.prefix) - 1
+
+    def query(self, start, stop):
+        # Welch PSD of x[start:stop]. Whole grid segments inside the range come
+        # from the prefix sums; an unaligned edge gets one segment anchored to it
+        # so the ends of the range are not left out of the estimate.
+        p = self.params
+        start = max(0, int(start))
+        stop = min(len(self.x), int(stop))
+        if stop - start < p.nperseg:
+            return welch(self.x[start:stop], fs=p.fs, axis=0, **p.welch_args)
+
+        first = -(-start // p.step)
+        last = (stop - p.nperseg) // p.step
+        if last >= first:
+            psd_sum = self.prefix[last + 1] - self.prefix[first]
+            count = last + 1 - first
+            edges = []
+            if first * p.step > start:
+                edges.append(start)
+            if last * p.step + p.nperseg < stop:
+                edges.append(stop - p.nperseg)
+        else:
+            psd_sum = 0.0
+            count = 0
+            edges = sorted({start, stop - p.nperseg})
+
+        for edge in edges:
+            psd_sum = psd_sum + p.segment_power(self.x[edge:edge + p.nperseg])[0]
+            count += 1
+        return p.scale_power(psd_sum, count)
@@ -0,0 +1,175 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Columnar binary copy of a CSV recording, written next to the CSV on first load.
+# Layout: MAGIC, 8-byte header length, JSON header, padding to ALIGN, then one
+# contiguous float array per column.
+SIDECAR_EXT = '.psdcol'
+MAGIC = b'PSDCOL1\n'
+ALIGN = 64
+NUMERIC_KINDS = 'biuf'
+SNIFF_ROWS = 1000
+
+
+class TextColumnsError(ValueError):
+    # The CSV has non-numeric columns (timestamps, labels), so it cannot be
+    # stored as a sidecar. data is the frame already parsed with pandas' own
+    # types, for callers to reuse instead of parsing the file again.
+    def __init__(self, csv_path, data):
+        text = [str(c) for c, t in data.dtypes.items() if t.kind not in NUMERIC_KINDS]
+        super().__init__(f"{csv_path} has non-numeric columns: {', '.join(text)}")
+        self.data = data
+
+
+def sidecar_path(csv_path, dtype=np.float64):
+    # float64 sidecars keep the plain extension; other dtypes get their own file
+    dtype = np.dtype(dtype)
+    if dtype == np.float64:
+        return csv_path + SIDECAR_EXT
+    return f"{csv_path}.{dtype.kind}{dtype.itemsize}{SIDECAR_EXT}"
+
+
+def source_stamp(csv_path):
+    st = os.stat(csv_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def write_sidecar(csv_path, data, dtype=np.float64, path=None):
+    path = path or sidecar_path(csv_path, dtype)
+    values = np.ascontiguousarray(data.to_numpy(dtype=dtype).T)
+    size, mtime_ns = source_stamp(csv_path)
+
+    header = {
+        'columns': [str(c) for c in data.columns],
+        'dtype': np.dtype(dtype).str,
+        'rows': int(values.shape[1]),
+        'source_size': size,
+        'source_mtime_ns': mtime_ns,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    offset = len(MAGIC) + 8 + len(header_bytes)
+    padding = (-offset) % ALIGN
+
+    # Write to a temporary file first so a crash never leaves a half-written sidecar
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        f.write(b'\0' * padding)
+        values.tofile(f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a sidecar file: {path}")
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length).decode('utf-8'))
+    offset = len(MAGIC) + 8 + length
+    header['offset'] = offset + (-offset) % ALIGN
+    return header
+
+
+def open_sidecar(path):
+    header = read_header(path)
+    shape = (len(header['columns']), header['rows'])
+    if shape[0] * shape[1] == 0:
+        values = np.empty(shape, dtype=header['dtype'])
+    else:
+        values = np.memmap(path, dtype=header['dtype'], mode='r', offset=header['offset'], shape=shape)
+    return header['columns'], values
+
+
+def is_fresh(csv_path, path=None):
+    path = path or sidecar_path(csv_path)
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return False
+    size, mtime_ns = source_stamp(csv_path)
+    return header['source_size'] == size and header['source_mtime_ns'] == mtime_ns
+
+
+def read_column_names(csv_path):
+    # Header row only, from the sidecar when it is current
+    path = sidecar_path(csv_path)
+    if is_fresh(csv_path, path):
+        return read_header(path)['columns']
+    return [str(c) for c in pd.read_csv(csv_path, nrows=0).columns]
+
+
+def parse_csv(csv_path, progress=None, chunksize=1 << 18, dtype=None):
+    # pd.read_csv, optionally in chunks with progress(fraction) called after
+    # each one; progress may raise to abort the parse. With dtype, columns are
+    # parsed straight into it; text columns make that fail, in which case the
+    # file is parsed with pandas' own types. Text in the first rows skips the
+    # typed attempt, so such files are only parsed once.
+    if dtype is not None and _looks_numeric(csv_path):
+        try:
+            return _parse_csv(csv_path, progress, chunksize, dtype)
+        except ValueError:
+            pass
+    return _parse_csv(csv_path, progress, chunksize, None)
+
+
+def _looks_numeric(csv_path, nrows=SNIFF_ROWS):
+    sample = pd.read_csv(csv_path, nrows=nrows)
+    return all(t.kind in NUMERIC_KINDS for t in sample.dtypes)
+
+
+def _parse_csv(csv_path, progress, chunksize, dtype):
+    if progress is None:
+        return pd.read_csv(csv_path, dtype=dtype)
+    size = max(os.path.getsize(csv_path), 1)
+    chunks = []
+    with open(csv_path, 'rb') as f:
+        for chunk in pd.read_csv(f, chunksize=chunksize, dtype=dtype):
+            chunks.append(chunk)
+            progress(min(f.tell() / size, 1.0))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(csv_path, dtype=dtype)
+
+
+def load_columns(csv_path, dtype=np.float64, progress=None):
+    # Returns (column names, array of shape (columns, rows)) backed by the sidecar,
+    # rebuilding it whenever the CSV's size or mtime no longer match the header
+    path = sidecar_path(csv_path, dtype)
+    if not is_fresh(csv_path, path) or read_header(path)['dtype'] != np.dtype(dtype).str:
+        data = parse_csv(csv_path, progress=progress, dtype=dtype)
+        if any(t.kind not in NUMERIC_KINDS for t in data.dtypes):
+            raise TextColumnsError(csv_path, data)
+        try:
+            write_sidecar(csv_path, data, dtype=dtype, path=path)
+        except OSError as e:
+            # Read-only location: fall back to the parsed CSV held in memory
+            print(f"Could not write sidecar for {csv_path}: {e}")
+            return [str(c) for c in data.columns], np.ascontiguousarray(data.to_numpy(dtype=dtype).T)
+    return open_sidecar(path)
+
+
+def numeric_values(data, dtype=np.float64):
+    # (column names, array of shape (columns, rows)) with text columns coerced
+    # to NaN, so column indices still match the CSV
+    values = np.empty((data.shape[1], len(data)), dtype=dtype)
+    for i, (_, column) in enumerate(data.items()):
+        values[i] = column if column.dtype.kind in NUMERIC_KINDS else pd.to_numeric(column, errors='coerce')
+    return [str(c) for c in data.columns], values
+
+
+def load_numeric_columns(csv_path, dtype=np.float64, progress=None):
+    # load_columns for any CSV: files with text columns are held in memory
+    # (they have no sidecar) with those columns as NaN
+    try:
+        return load_columns(csv_path, dtype=dtype, progress=progress)
+    except TextColumnsError as e:
+        return numeric_values(e.data, dtype)
+
+
+def read_csv_cached(csv_path, dtype=np.float64, progress=None):
+    columns, values = load_columns(csv_path, dtype=dtype, progress=progress)
+    # values.T is a view, so the DataFrame shares the memory-mapped buffer
+    return pd.DataFrame(values.T, columns=columns, copy=False)
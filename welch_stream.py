@@ -0,0 +1,195 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.fft import rfftfreq
+from scipy.signal import detrend as scipy_detrend, welch
+from fft_plans import get_plan
+from sidecar import load_columns, open_sidecar, sidecar_path
+
+DEFAULT_CHUNKSIZE = 1 << 20
+# Segments per thread-pool task when workers > 1
+THREAD_BLOCK = 512
+
+
+def resolve_workers(workers):
+    # scipy.fft convention: None means 1, negative counts back from cpu_count()
+    if workers is None:
+        return 1
+    if workers < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + workers)
+    return max(1, workers)
+
+
+class WelchAccumulator:
+    # Running Welch estimate: segments are cut, detrended, windowed and their
+    # periodograms summed as samples arrive, with the last nperseg - step
+    # samples carried over so segments spanning chunk boundaries are not lost.
+    # Samples run along axis 0; a 2-D chunk is (samples x channels).
+    def __init__(self, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None, detrend='constant',
+                 workers=None, dtype=np.float64):
+        self.fs = fs
+        self.workers = resolve_workers(workers)
+        # Working precision of the windowing and FFTs. Segment sums are always
+        # accumulated in float64, so float32 only loses precision per segment.
+        self.dtype = np.dtype(dtype)
+        self.welch_args = dict(window=window, nperseg=nperseg, noverlap=noverlap, nfft=nfft, detrend=detrend)
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 2 if noverlap is None else noverlap
+        self.nfft = nperseg if nfft is None else nfft
+        self.detrend = detrend
+        if not 0 <= self.noverlap < nperseg:
+            raise ValueError("noverlap must be less than nperseg.")
+        if self.nfft < nperseg:
+            raise ValueError("nfft must be greater than or equal to nperseg.")
+
+        # Window, its normalisation and the rfft setup are shared through the plan cache
+        self.plan = get_plan(window, nperseg, nfft=self.nfft, dtype=self.dtype, workers=self.workers)
+        self.window = self.plan.window
+        if self.window.shape != (nperseg,):
+            raise ValueError("window must have length nperseg.")
+        self.step = nperseg - self.noverlap
+        # Density scaling as in scipy.signal.welch, applied once in finalize
+        self.scale = self.plan.density_scale(fs)
+
+        self.psd_sum = None
+        self.count = 0
+        self.tail = None
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk).astype(self.dtype, copy=False)
+        buf = chunk if self.tail is None or len(self.tail) == 0 else np.concatenate([self.tail, chunk])
+        if len(buf) < self.nperseg:
+            self.tail = buf
+            return self
+
+        n_segments = (len(buf) - self.nperseg) // self.step + 1
+        power = self.power_sum(buf, n_segments)
+
+        self.psd_sum = power if self.psd_sum is None else self.psd_sum + power
+        self.count += n_segments
+        self.tail = buf[n_segments * self.step:].copy()
+        return self
+
+    def power_sum(self, buf, n_segments):
+        # Summed segment power of buf. With several workers the segment stack is
+        # split into blocks handled by a thread pool (numpy and pocketfft release
+        # the GIL), so detrending and windowing run in parallel with the FFTs.
+        if self.workers == 1 or n_segments < 2 * THREAD_BLOCK:
+            return self.segment_power(buf).sum(axis=0, dtype=np.float64)
+
+        n_blocks = min(self.workers * 4, -(-n_segments // THREAD_BLOCK))
+        edges = np.linspace(0, n_segments, n_blocks + 1).astype(int)
+        single = get_plan(self.welch_args['window'], self.nperseg, nfft=self.nfft, dtype=self.dtype, workers=1)
+
+        def block_power(k0, k1):
+            return self.segment_power(buf[k0 * self.step:(k1 - 1) * self.step + self.nperseg],
+                                      plan=single).sum(axis=0, dtype=np.float64)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            partials = list(pool.map(block_power, edges[:-1], edges[1:]))
+        return np.sum(partials, axis=0)
+
+    def segment_power(self, buf, plan=None):
+        # |rfft|^2 of every whole segment in buf: (segments, [channels,] freqs)
+        segments = np.lib.stride_tricks.sliding_window_view(buf, self.nperseg, axis=0)[::self.step]
+        # sliding_window_view puts the window on the last axis: (segments, [channels,] nperseg)
+        if self.detrend:
+            segments = scipy_detrend(segments, type=self.detrend, axis=-1)
+        spectrum = (plan or self.plan).rfft(segments * self.window)
+        return spectrum.real ** 2 + spectrum.imag ** 2
+
+    def merge(self, other):
+        # Combine the segment sums of another accumulator over a disjoint set of
+        # segments (see shard_bounds). Samples left in other's tail are dropped.
+        if (self.fs, self.nperseg, self.noverlap, self.nfft, self.detrend, self.dtype) != \
+                (other.fs, other.nperseg, other.noverlap, other.nfft, other.detrend, other.dtype) \
+                or not np.array_equal(self.window, other.window):
+            raise ValueError("Cannot merge accumulators with different Welch parameters.")
+        if other.psd_sum is not None:
+            self.psd_sum = other.psd_sum.copy() if self.psd_sum is None else self.psd_sum + other.psd_sum
+            self.count += other.count
+        return self
+
+    def finalize(self):
+        if self.count == 0:
+            # Shorter than one segment: let welch shrink nperseg as it does for short input
+            if self.tail is None or len(self.tail) == 0:
+                raise ValueError("No samples were accumulated.")
+            return welch(self.tail, fs=self.fs, axis=0, **self.welch_args)
+
+        return self.scale_power(self.psd_sum, self.count)
+
+    def scale_power(self, psd_sum, count):
+        Pxx = psd_sum * (self.scale / count)
+        # One-sided spectrum: double everything except DC (and Nyquist for even nfft)
+        if self.nfft % 2:
+            Pxx[..., 1:] *= 2
+        else:
+            Pxx[..., 1:-1] *= 2
+        f = rfftfreq(self.nfft, 1 / self.fs)
+        # Match welch(x, axis=0): frequencies first, channels second
+        return f, np.moveaxis(Pxx, -1, 0)
+
+
+def shard_bounds(n_samples, nperseg, noverlap, n_shards):
+    # Split a record into sample ranges that each hold a whole number of Welch
+    # segments; neighbouring ranges overlap by noverlap so every segment of the
+    # full record is computed by exactly one shard.
+    step = nperseg - noverlap
+    n_segments = (n_samples - noverlap) // step if n_samples >= nperseg else 0
+    edges = np.linspace(0, n_segments, min(n_shards, n_segments) + 1).astype(int)
+    return [(int(a * step), int((b - 1) * step + nperseg)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _welch_shard(path, columns, start, stop, params, block=DEFAULT_CHUNKSIZE):
+    _, values = open_sidecar(path)
+    acc = WelchAccumulator(**params)
+    channels = values[columns]
+    for block_start in range(start, stop, block):
+        acc.update(channels[..., block_start:min(block_start + block, stop)].T)
+    return acc
+
+
+def parallel_welch(file_path, columns, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None,
+                   detrend='constant', max_workers=None, dtype=np.float64):
+    # Welch over the memory-mapped sidecar, one shard per worker process,
+    # reduced with WelchAccumulator.merge
+    _, values = load_columns(file_path, dtype=dtype)
+    params = dict(fs=fs, window=window, nperseg=nperseg, noverlap=noverlap, nfft=nfft, detrend=detrend,
+                  dtype=dtype)
+    result = WelchAccumulator(**params)
+    bounds = shard_bounds(values.shape[1], nperseg, result.noverlap, max_workers or os.cpu_count() or 1)
+    if not bounds:
+        return result.update(np.asarray(values[columns]).T).finalize()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_welch_shard, sidecar_path(file_path, dtype), columns, start, stop, params)
+                   for start, stop in bounds]
+        for future in futures:
+            result.merge(future.result())
+    return result.finalize()
+
+
+def iter_csv_chunks(file_path, columns, chunksize=DEFAULT_CHUNKSIZE, dtype=np.float64, progress=None):
+    # Yields (rows x len(columns)) arrays, or 1-D arrays for a single column index.
+    # progress(fraction) is called after each chunk and may raise to stop early.
+    single = np.isscalar(columns)
+    usecols = [columns] if single else list(columns)
+    size = max(os.path.getsize(file_path), 1)
+    with open(file_path, 'rb') as f:
+        for frame in pd.read_csv(f, usecols=usecols, chunksize=chunksize, dtype=dtype):
+            # usecols ignores order, so reselect by position to honour the request
+            values = frame.iloc[:, np.argsort(np.argsort(usecols))].to_numpy(dtype=dtype)
+            yield values[:, 0] if single else values
+            if progress is not None:
+                progress(min(f.tell() / size, 1.0))
+
+
+def streaming_welch(file_path, columns, fs=1.0, window='hann', nperseg=256, noverlap=None, nfft=None,
+                    detrend='constant', chunksize=DEFAULT_CHUNKSIZE, progress=None, workers=None, dtype=np.float64):
+    acc = WelchAccumulator(fs=fs, window=window, nperseg=nperseg, noverlap=noverlap, nfft=nfft, detrend=detrend,
+                           workers=workers, dtype=dtype)
+    for chunk in iter_csv_chunks(file_path, columns, chunksize=chunksize, dtype=dtype, progress=progress):
+        acc.update(chunk)
+    return acc.finalize()